@@ -0,0 +1,131 @@
+# analytics.py
+import threading
+import time
+import pandas as pd
+from ipfs import client as default_client
+from export import STATUS_NAMES, EXPORT_CHUNK_SIZE
+
+GROUP_KEYS = ["Disease", "Treatment Group", "Status"]
+MEASURES = ["Blood Sugar Level", "Cholesterol Level", "Age", "Dosage"]
+ROW_COLUMNS = ["CID"] + GROUP_KEYS + MEASURES
+FAILED_RETRY_SECONDS = 300  # CIDs that failed to load are not fetched again until this long afterwards
+
+
+# Reduce fetched trial records to one row of group keys and numeric measures each, vectorized per chunk
+def _partials(frames):
+    records = pd.concat([df.head(1) for df in frames], ignore_index=True).reindex(columns=MEASURES + GROUP_KEYS[:2])
+    partial = pd.DataFrame(index=records.index)
+    for key in GROUP_KEYS[:2]:
+        partial[key] = records[key].astype('string')
+    for measure in ["Blood Sugar Level", "Cholesterol Level", "Age"]:
+        partial[measure] = pd.to_numeric(records[measure], errors='coerce').astype('Float64')
+    # Dosage is free text such as "500" or "500 mg": keep the leading number
+    partial["Dosage"] = pd.to_numeric(records["Dosage"].astype('string').str.extract(r'(\d+(?:\.\d+)?)')[0],
+                                      errors='coerce').astype('Float64')
+    return partial
+
+
+class CohortAnalytics:
+    # Columnar frame of one row per trial, folded in incrementally as trials are created or updated
+    def __init__(self, client=None):
+        self.client = client or default_client
+        self.rows = pd.DataFrame({column: pd.Series(dtype='object') for column in ROW_COLUMNS}).rename_axis("Trial ID")
+        self.partials = {}  # CID -> partial row, reused whenever a CID is seen again
+        self.errors = {}  # CID -> last fetch error
+        self.failed_at = {}  # CID -> time of the last failed fetch
+        self.lock = threading.Lock()
+        self.fold_lock = threading.Lock()
+        self.worker_lock = threading.Lock()
+        self.worker = None
+        self.folded_key = None  # key of the last background refresh
+        self.last_error = None
+
+    # Bring the frame in line with the given trials (get_trial()-shaped tuples); returns the number of rows changed
+    def fold(self, trials, chunk_size=EXPORT_CHUNK_SIZE):
+        trials = list(trials)
+        # Folds are serialised; self.lock is only held to swap in the new frame, so readers never wait on IPFS
+        with self.fold_lock:
+            rows = self.rows
+            # Trials that disappeared (e.g. rolled back by a reorg) drop out of the frame
+            stale = rows.index.difference([trial[0] for trial in trials])
+            if len(stale):
+                rows = rows.drop(index=stale)
+            known = rows[["CID", "Status"]].to_dict('index')
+            changed = [trial for trial in trials if trial[2] and
+                       known.get(trial[0]) != {"CID": trial[2], "Status": STATUS_NAMES[trial[3]]}]
+            now = time.time()
+            missing = list(dict.fromkeys(trial[2] for trial in changed if trial[2] not in self.partials and
+                                         now - self.failed_at.get(trial[2], 0) >= FAILED_RETRY_SECONDS))
+            for start in range(0, len(missing), chunk_size):
+                self._load_partials(missing[start:start + chunk_size])
+            changed = [trial for trial in changed if trial[2] in self.partials]
+            if changed:
+                update = pd.DataFrame([self.partials[trial[2]] for trial in changed],
+                                      index=pd.Index([trial[0] for trial in changed], name="Trial ID"))
+                update["CID"] = [trial[2] for trial in changed]
+                update["Status"] = [STATUS_NAMES[trial[3]] for trial in changed]
+                rest = rows.drop(index=update.index, errors='ignore')
+                rows = pd.concat([rest, update[ROW_COLUMNS]]) if len(rest) else update[ROW_COLUMNS]
+            with self.lock:
+                self.rows = rows
+            return len(changed) + len(stale)
+
+    def _load_partials(self, cids):
+        results = self.client.get_many(cids)
+        loaded = [(cid, df) for cid, df, error in results if error is None and len(df)]
+        for cid, _, error in results:
+            if error is not None:
+                self.errors[cid] = str(error)
+                self.failed_at[cid] = time.time()
+            else:
+                self.errors.pop(cid, None)
+                self.failed_at.pop(cid, None)
+        if loaded:
+            partial = _partials([df for _, df in loaded])
+            for (cid, _), row in zip(loaded, partial.to_dict('records')):
+                self.partials[cid] = row
+
+    # Fold list_trials() in a background thread whenever key (e.g. the indexed block) moves
+    def refresh(self, list_trials, key):
+        with self.worker_lock:
+            if self.refreshing() or key == self.folded_key:
+                return
+            self.worker = threading.Thread(target=self._refresh, args=(list_trials, key), daemon=True)
+            self.worker.start()
+
+    def _refresh(self, list_trials, key):
+        try:
+            self.fold(list_trials())
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+        self.folded_key = key
+
+    def refreshing(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    # Count, mean, spread and quartiles of each measure per cohort
+    def summary(self, by=("Disease",), measures=MEASURES):
+        with self.lock:
+            rows = self.rows
+        if rows.empty:
+            return pd.DataFrame()
+        grouped = rows.groupby(list(by), dropna=False)
+        stats = grouped[list(measures)].agg(['count', 'mean', 'std', 'min', 'median', 'max'])
+        stats.insert(0, ('Trials', 'count'), grouped.size())
+        return stats
+
+    # Histogram of one measure, optionally split by a group key; returns a bins x groups frame of counts
+    def distribution(self, measure, bins=20, by=None):
+        with self.lock:
+            rows = self.rows
+        values = rows[measure].dropna().astype(float)
+        if values.empty:
+            return pd.DataFrame()
+        buckets = pd.cut(values, bins=bins)
+        if by is None:
+            counts = buckets.value_counts(sort=False).to_frame("Trials")
+        else:
+            counts = pd.crosstab(buckets, rows.loc[values.index, by])
+        counts.index = counts.index.astype(str)
+        return counts
@@ -0,0 +1,205 @@
+# anchoring.py
+# Optional batched anchoring: record CIDs are buffered locally, combined into a Merkle tree, and only
+# the root is committed on-chain. Each record keeps an inclusion proof for later verification.
+import json
+import sqlite3
+import threading
+import time
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+from web3.logs import DISCARD
+from interact_with_contract import web3, contract, transaction_manager, has_function
+
+DEFAULT_DB_PATH = 'anchors.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pending (cid TEXT PRIMARY KEY, label TEXT, added REAL);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id INTEGER PRIMARY KEY,
+    root TEXT NOT NULL,
+    leaf_count INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    anchored REAL
+);
+CREATE TABLE IF NOT EXISTS proofs (
+    cid TEXT PRIMARY KEY,
+    label TEXT,
+    batch_id INTEGER NOT NULL,
+    leaf_index INTEGER NOT NULL,
+    proof TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submitted (
+    root TEXT PRIMARY KEY,
+    leaf_count INTEGER NOT NULL,
+    tx_hash TEXT,
+    submitted REAL
+);
+CREATE TABLE IF NOT EXISTS submitted_leaves (
+    cid TEXT PRIMARY KEY,
+    label TEXT,
+    root TEXT NOT NULL,
+    leaf_index INTEGER NOT NULL,
+    proof TEXT NOT NULL
+);
+'''
+
+# Record states reported by list_records
+PENDING = 'pending'
+SUBMITTED = 'submitted'
+ANCHORED = 'anchored'
+
+
+# Leaves are double-hashed so a leaf can never be confused with an inner node
+def leaf_hash(cid):
+    return Web3.keccak(Web3.keccak(text=cid))
+
+
+def _hash_pair(a, b):
+    return Web3.keccak(a + b) if a <= b else Web3.keccak(b + a)
+
+
+# Function to build a Merkle tree over leaves; returns (root, proofs) with one proof per leaf
+def build_tree(leaves):
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree with no leaves")
+    proofs = [[] for _ in leaves]
+    positions = list(range(len(leaves)))  # index of each leaf's ancestor in the current level
+    level = list(leaves)
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level), 2):
+            if i + 1 < len(level):
+                next_level.append(_hash_pair(level[i], level[i + 1]))
+            else:
+                next_level.append(level[i])  # Odd node is promoted unchanged
+        for leaf, position in enumerate(positions):
+            sibling = position ^ 1
+            if sibling < len(level):
+                proofs[leaf].append(level[sibling])
+            positions[leaf] = position // 2
+        level = next_level
+    return level[0], proofs
+
+
+# Function to fold a proof back up to a root
+def compute_root(leaf, proof):
+    node = leaf
+    for sibling in proof:
+        node = _hash_pair(node, sibling)
+    return node
+
+
+class Anchorer:
+    # Buffers record CIDs and anchors them on-chain in Merkle batches
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def add(self, cid, label=None):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO pending VALUES (?, ?, ?)', (cid, label, time.time()))
+
+    def pending_count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM pending').fetchone()[0]
+
+    # Submit every pending CID as one anchorRoot transaction without waiting for it to be mined;
+    # returns the transaction hash (None if nothing is pending). settle() records the outcome.
+    def flush(self, account):
+        if not has_function('anchorRoot'):
+            raise Exception("The deployed contract does not support anchoring; redeploy with deploy_contract.py")
+        # Held until the batch is submitted, so concurrent sessions can never anchor the same records twice
+        with self.lock:
+            pending = self.conn.execute('SELECT cid, label FROM pending ORDER BY added, cid').fetchall()
+            if not pending:
+                return None
+            root, proofs = build_tree([leaf_hash(cid) for cid, _ in pending])
+            root_hex = Web3.to_hex(root)
+            with self.conn:
+                self.conn.execute('INSERT INTO submitted VALUES (?, ?, NULL, ?)', (root_hex, len(pending), time.time()))
+                self.conn.executemany('INSERT OR REPLACE INTO submitted_leaves VALUES (?, ?, ?, ?, ?)', [
+                    (cid, label, root_hex, index, json.dumps([Web3.to_hex(node) for node in proofs[index]]))
+                    for index, (cid, label) in enumerate(pending)
+                ])
+                self.conn.executemany('DELETE FROM pending WHERE cid = ?', [(cid,) for cid, _ in pending])
+            try:
+                tx_hash = transaction_manager.submit(contract.functions.anchorRoot(root, len(pending)), account,
+                                                     label=f"Anchor {len(pending)} records")
+            except Exception:
+                self._restore(root_hex)
+                raise
+            with self.conn:
+                self.conn.execute('UPDATE submitted SET tx_hash = ? WHERE root = ?', (tx_hash, root_hex))
+        return tx_hash
+
+    # Put the records of a batch that never made it on-chain back in the pending queue
+    def _restore(self, root_hex):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO pending SELECT cid, label, ? FROM submitted_leaves WHERE root = ?',
+                              (time.time(), root_hex))
+            self.conn.execute('DELETE FROM submitted_leaves WHERE root = ?', (root_hex,))
+            self.conn.execute('DELETE FROM submitted WHERE root = ?', (root_hex,))
+
+    # Record the outcome of submitted batches whose transactions have been mined; returns the batches anchored
+    def settle(self):
+        anchored = []
+        with self.lock:
+            for root_hex, leaf_count, tx_hash in self.conn.execute(
+                    'SELECT root, leaf_count, tx_hash FROM submitted').fetchall():
+                if tx_hash is None:
+                    # Interrupted before the transaction was sent
+                    self._restore(root_hex)
+                    continue
+                try:
+                    receipt = web3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    continue
+                if receipt['status'] != 1:
+                    self._restore(root_hex)
+                    continue
+                batch_id = contract.events.RootAnchored().process_receipt(receipt, errors=DISCARD)[0]['args']['batchId']
+                with self.conn:
+                    self.conn.execute('INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?, ?)',
+                                      (batch_id, root_hex, leaf_count, tx_hash, time.time()))
+                    self.conn.execute('INSERT OR REPLACE INTO proofs SELECT cid, label, ?, leaf_index, proof '
+                                      'FROM submitted_leaves WHERE root = ?', (batch_id, root_hex))
+                    self.conn.execute('DELETE FROM submitted_leaves WHERE root = ?', (root_hex,))
+                    self.conn.execute('DELETE FROM submitted WHERE root = ?', (root_hex,))
+                anchored.append(batch_id)
+        return anchored
+
+    # Every record known to the anchorer as dicts with cid, label, state and batch_id:
+    # pending and submitted records first, then anchored batches newest first
+    def list_records(self, limit=None):
+        query = '''
+            SELECT * FROM (
+                SELECT cid, label, ? AS state, NULL AS batch_id, added AS position FROM pending
+                UNION ALL SELECT cid, label, ?, NULL, leaf_index FROM submitted_leaves
+                UNION ALL SELECT cid, label, ?, batch_id, leaf_index FROM proofs
+            ) ORDER BY batch_id IS NOT NULL, batch_id DESC, position'''
+        params = [PENDING, SUBMITTED, ANCHORED]
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [{'cid': cid, 'label': label, 'state': state, 'batch_id': batch_id}
+                for cid, label, state, batch_id, _ in rows]
+
+    # Stored inclusion proof for a CID: {'batch_id', 'leaf_index', 'proof', 'label'} or None
+    def proof(self, cid):
+        with self.lock:
+            row = self.conn.execute('SELECT label, batch_id, leaf_index, proof FROM proofs WHERE cid = ?', (cid,)).fetchone()
+        if row is None:
+            return None
+        return {'label': row[0], 'batch_id': row[1], 'leaf_index': row[2],
+                'proof': [Web3.to_bytes(hexstr=node) for node in json.loads(row[3])]}
+
+    # Check a CID's inclusion proof on-chain with verifyAnchored
+    def verify(self, cid):
+        inclusion = self.proof(cid)
+        if inclusion is None:
+            return False
+        return contract.functions.verifyAnchored(inclusion['batch_id'], leaf_hash(cid), inclusion['proof']).call()
@@ -1,39 +1,173 @@
+import os
+import tempfile
+from contextlib import nullcontext
 import streamlit as st
 import pandas as pd
 from datetime import datetime, date
-from interact_with_contract import create_trial, update_trial, get_trial, get_trial_count, get_accounts, web3
-from ipfs import add_csv_to_ipfs, get_csv_from_ipfs
+from interact_with_contract import created_trial_ids, submit_create_trial, submit_create_trials, submit_update_trial, get_trial, get_trial_count, get_accounts, transaction_manager, contract_address, web3
+from ipfs import add_csv_to_ipfs, get_csv_from_ipfs, client as ipfs_client, PAYLOAD_FORMATS, PARQUET
+from indexer import TrialIndexer
+from export import EXPORT_FORMATS, write_export
+from ingest import scan_csv, upload_csv
+from analytics import CohortAnalytics, GROUP_KEYS, MEASURES, FAILED_RETRY_SECONDS
+from anchoring import Anchorer, ANCHORED
+from live_updates import LiveTrialFeed, WEBSOCKET
+from trial_history import write_update, history as trial_history, diff_versions
+from metrics import registry as metrics_registry, trace, span, serve_metrics
+from validation import (DISEASES, CANCER_TYPES, CANCER_STAGES, GENDERS, TREATMENT_GROUPS, BLOOD_SUGAR_RANGE,
+                        CHOLESTEROL_RANGE, restricted_gender as cancer_restricted_gender, validate_trials, build_trial_records,
+                        read_roster)
 
 # Page Config
 st.set_page_config(page_title="MedChainTrial", page_icon="🔬", layout="wide")
 st.title("MedChainTrials: Decentralized Clinical Trial Data Assurance Platform")
+
+# Seconds between chain head checks; cached chain reads are only refreshed when the head moves
+BLOCK_POLL_SECONDS = 2
+LIVE_REFRESH_SECONDS = 2
+METRICS_PORT = None  # set to a port to serve /metrics for Prometheus scraping
+
+# Local event index of all trials, shared by every session in this process
+@st.cache_resource
+def get_trial_indexer():
+    return TrialIndexer()
+
+@st.cache_data(ttl=BLOCK_POLL_SECONDS, show_spinner=False)
+def latest_block_number():
+    return web3.eth.block_number
+
+# Chain reads below are keyed on the block number, so reruns within a block hit the cache
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_accounts(block_number):
+    return get_accounts()
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_trial_count(block_number):
+    return get_trial_count()
+
+# Bring the shared index up to block_number; a local check with no RPC calls when it is already there
+def sync_trial_index(block_number):
+    if get_trial_indexer().last_block < block_number:
+        get_trial_indexer().sync()
+
+@st.cache_resource
+def get_anchorer():
+    return Anchorer()
+
+# Pushes new trials into the index over a WebSocket subscription (HTTP polling as fallback)
+@st.cache_resource
+def get_live_feed():
+    feed = LiveTrialFeed(get_trial_indexer())
+    feed.start()
+    return feed
+
+# Cohort statistics over all trials, folded in incrementally as trials change
+@st.cache_resource
+def get_cohort_analytics():
+    return CohortAnalytics()
+
+@st.cache_resource
+def start_metrics_server(port):
+    return serve_metrics(port)
+
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
+trial_indexer = get_trial_indexer()
+live_feed = get_live_feed()
+anchorer = get_anchorer()
 # Sidebar for account selection
-accounts = get_accounts()
+accounts = cached_accounts(latest_block_number())
 selected_account = st.sidebar.selectbox("Select Account", accounts)
 
 # Debugging information in the sidebar
 with st.sidebar.expander("Debug Information", expanded=True):
     st.write("Current Account:", selected_account)
-    st.write("Contract Address:", "0x497615B8bbf78A188870251a17565Fc038fAD45F")
+    st.write("Contract Address:", contract_address)
     st.write("IPFS Node URL:", "http://127.0.0.1:5001")  # Adjust this to your IPFS node address
+    st.write("IPFS Cache:", ipfs_client.cache.stats())
     
     if st.button("Check Contract Connection"):
         try:
-            trial_count = get_trial_count()
+            trial_count = cached_trial_count(latest_block_number())
             st.success(f"Successfully connected to the contract. Current trial count: {trial_count}")
         except Exception as e:
             st.error(f"Failed to connect to the contract: {str(e)}")
     
     if st.button("Check IPFS Connection"):
         try:
-            # Try to add a simple file to IPFS
-            test_hash = add_csv_to_ipfs(pd.DataFrame({'test': [1, 2, 3]}))
-            st.success(f"Successfully connected to IPFS. Test hash: {test_hash}")
+            # Ask the daemon for its version instead of uploading a test file
+            ipfs_version = ipfs_client.version()
+            st.success(f"Successfully connected to IPFS. Version: {ipfs_version}")
         except Exception as e:
             st.error(f"Failed to connect to IPFS: {str(e)}")
 
+    # Hot-path latencies, payload sizes, errors and cache hits, refreshed in place
+    @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+    def metrics_panel():
+        latencies = metrics_registry.latency_summary()
+        if latencies:
+            st.dataframe(pd.DataFrame(latencies), hide_index=True)
+        else:
+            st.caption("No calls recorded yet.")
+        counters = metrics_registry.counter_summary()
+        if counters:
+            st.dataframe(pd.DataFrame(counters), hide_index=True)
+
+    st.write("Metrics:")
+    metrics_panel()
+    st.download_button("Download Metrics (Prometheus)", data=metrics_registry.render_prometheus(),
+                       file_name="medchain_metrics.prom", mime="text/plain")
+
+    recent_traces = metrics_registry.recent_traces()
+    if recent_traces:
+        selected_trace = st.selectbox(
+            "Recent Traces", range(len(recent_traces)),
+            format_func=lambda i: f"{recent_traces[i]['name']} at {datetime.fromtimestamp(recent_traces[i]['start']):%H:%M:%S} "
+                                  f"({recent_traces[i]['duration']:.2f}s)")
+        spans = pd.DataFrame(recent_traces[selected_trace]['spans'], columns=['name', 'duration', 'error'])
+        if not spans.empty:
+            # Time per stage; spans from concurrent workers overlap, so totals can exceed the trace duration
+            st.dataframe(spans.groupby('name').agg(Calls=('duration', 'size'), Total_s=('duration', 'sum'),
+                                                   Max_s=('duration', 'max'), Errors=('error', 'count')))
+
+# Submitted transactions are confirmed in the background; their state is shown here
+with st.sidebar.expander("Transactions", expanded=bool(transaction_manager.pending())):
+    recent_transactions = transaction_manager.list_transactions(limit=20)
+    if recent_transactions:
+        st.caption(f"{len(transaction_manager.pending())} pending")
+        st.dataframe(pd.DataFrame([{
+            "Transaction": record['label'],
+            "State": record['state'],
+            "Nonce": record['nonce'],
+            "Trial IDs": ", ".join(map(str, created_trial_ids(record['receipt']))) if record['receipt'] else "",
+            "Hash": record['hash'],
+            "Error": record['error'] or "",
+        } for record in recent_transactions]), hide_index=True)
+        st.button("Refresh Transactions")
+    else:
+        st.caption("No transactions submitted yet.")
+
+# Anchored records are committed on-chain as Merkle roots in batches
+with st.sidebar.expander("Record Anchoring"):
+    try:
+        for batch_id in anchorer.settle():
+            st.success(f"Records anchored in batch {batch_id}.")
+    except Exception as e:
+        st.error(f"Error checking anchoring transactions: {str(e)}")
+    st.caption(f"{anchorer.pending_count()} records waiting to be anchored")
+    if st.button("Anchor Pending Records"):
+        try:
+            anchor_tx = anchorer.flush(selected_account)
+            if anchor_tx is None:
+                st.info("No records waiting to be anchored.")
+            else:
+                st.success(f"Anchoring transaction submitted: {anchor_tx}")
+        except Exception as e:
+            st.error(f"Error anchoring records: {str(e)}")
+
 # Create tabs
-tab1, tab2, tab3, tab4 = st.tabs(["🔍 Create Trial", "🔄 Update Trial", "📊 View Trials", "📁 Upload Dataset"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["🔍 Create Trial", "🔄 Update Trial", "📊 View Trials", "📁 Upload Dataset", "📈 Analytics"])
 
 # Tab 1: Create New Trial (Disease-specific inputs)
 with tab1:
@@ -44,7 +178,7 @@ with tab1:
     patient_name = st.text_input("Patient Name", help="Enter the patient's full name.")
 
     # Disease selection
-    disease = st.selectbox("Select Disease for the Trial", ["Diabetes", "Hypertension", "Cancer", "Cardiovascular"])
+    disease = st.selectbox("Select Disease for the Trial", DISEASES)
 
     # Gender-specific or age-specific logic
     cancer_type = None
@@ -55,7 +189,7 @@ with tab1:
     if disease == "Diabetes":
         medication = st.text_input("Medication for Diabetes", help="Enter the medication or treatment being tested for Diabetes.")
         dosage = st.text_input("Dosage (mg)", help="Enter the dosage of the medication.")
-        blood_sugar_level = st.number_input("Blood Sugar Level (mg/dL)", min_value=50, max_value=500, help="Enter the patient's blood sugar level.")
+        blood_sugar_level = st.number_input("Blood Sugar Level (mg/dL)", min_value=BLOOD_SUGAR_RANGE[0], max_value=BLOOD_SUGAR_RANGE[1], help="Enter the patient's blood sugar level.")
     
     elif disease == "Hypertension":
         medication = st.text_input("Medication for Hypertension", help="Enter the medication or treatment being tested for Hypertension.")
@@ -63,27 +197,24 @@ with tab1:
         blood_pressure = st.text_input("Blood Pressure (mmHg)", help="Enter the patient's blood pressure.")
     
     elif disease == "Cancer":
-        cancer_type = st.selectbox("Cancer Type", ["Breast Cancer (Female)", "Ovarian Cancer (Female)", "Prostate Cancer (Male)", "Lung Cancer"])
+        cancer_type = st.selectbox("Cancer Type", CANCER_TYPES)
         
         # Restrict gender based on cancer type
-        if "Female" in cancer_type:
-            restricted_gender = "Female"
-        elif "Male" in cancer_type:
-            restricted_gender = "Male"
+        restricted_gender = cancer_restricted_gender(cancer_type)
 
         medication = st.text_input("Chemotherapy/Medication", help="Enter the medication or treatment being tested for Cancer.")
         dosage = st.text_input("Dosage (mg)", help="Enter the dosage of the medication.")
-        cancer_stage = st.selectbox("Cancer Stage", ["Stage I", "Stage II", "Stage III", "Stage IV"])
+        cancer_stage = st.selectbox("Cancer Stage", CANCER_STAGES)
     
     elif disease == "Cardiovascular":
         medication = st.text_input("Medication for Cardiovascular Disease", help="Enter the medication or treatment being tested.")
         dosage = st.text_input("Dosage (mg)", help="Enter the dosage of the medication.")
-        cholesterol_level = st.number_input("Cholesterol Level (mg/dL)", min_value=100, max_value=400, help="Enter the patient's cholesterol level.")
+        cholesterol_level = st.number_input("Cholesterol Level (mg/dL)", min_value=CHOLESTEROL_RANGE[0], max_value=CHOLESTEROL_RANGE[1], help="Enter the patient's cholesterol level.")
 
     # Common input fields
     
     patient_dob = st.date_input("Patient Date of Birth", min_value=date(1900, 1, 1), max_value=date.today())
-    patient_gender = st.selectbox("Patient Gender", ["Male", "Female", "Other"], disabled=True if restricted_gender else False, index=["Male", "Female", "Other"].index(restricted_gender) if restricted_gender else 0)
+    patient_gender = st.selectbox("Patient Gender", GENDERS, disabled=True if restricted_gender else False, index=GENDERS.index(restricted_gender) if restricted_gender else 0)
 
     # Age validation for age-specific conditions
     age = (date.today() - patient_dob).days // 365
@@ -91,17 +222,20 @@ with tab1:
         st.warning("Ovarian Cancer trials are typically for patients above 18 years old.")
     
     patient_condition = st.text_area("Patient Condition", help="Describe the patient's medical condition.")
-    treatment_group = st.selectbox("Treatment Group", ["Control", "Experimental"])
+    treatment_group = st.selectbox("Treatment Group", TREATMENT_GROUPS)
     start_date = st.date_input("Trial Start Date")
     end_date = st.date_input("Expected End Date")
 
+    registration_mode = st.radio("Registration", ["On-chain Trial", "Anchored Batch"], horizontal=True,
+                                 help="Anchored records are committed later as part of a Merkle batch.")
+
     if st.button("Submit New Trial"):
         try:
             if not all([patient_id, patient_name, patient_condition, medication, dosage]):
                 st.warning("All fields marked with * are required.")
             else:
-                trial_count = get_trial_count() + 1
-                trial_name = f"Trial ID {trial_count} - {patient_name} - {disease}"
+                # The trial ID is assigned by the contract when the transaction is mined
+                trial_name = f"{patient_name} - {disease}"
 
                 patient_data = {
                     "Trial Name": [trial_name],
@@ -130,9 +264,12 @@ with tab1:
 
                 df = pd.DataFrame(patient_data)
                 ipfs_hash = add_csv_to_ipfs(df)
-                with st.spinner("Submitting trial..."):
-                    tx_receipt = create_trial(patient_id, ipfs_hash, selected_account)
-                st.success(f"Trial created successfully! IPFS Hash: {ipfs_hash}")
+                if registration_mode == "Anchored Batch":
+                    anchorer.add(ipfs_hash, label=patient_id)
+                    st.success(f"Trial record queued for anchoring. IPFS Hash: {ipfs_hash}")
+                else:
+                    tx_hash = submit_create_trial(patient_id, ipfs_hash, selected_account)
+                    st.success(f"Trial submitted! IPFS Hash: {ipfs_hash}. Transaction: {tx_hash}")
         except Exception as e:
             st.error(f"Error creating trial: {str(e)}")
 
@@ -175,17 +312,34 @@ with tab2:
                 updated_data[column] = st.text_input(f"{column}", df[column].iloc[0])
         
         additional_notes = st.text_area("Additional Notes", help="Enter any additional information or updates.")
+
+        if trial[2]:
+            with st.expander("Version History"):
+                try:
+                    versions = trial_history(ipfs_client, trial[2])
+                    st.dataframe(pd.DataFrame(versions, columns=["IPFS Hash", "Version", "Stored As"]), hide_index=True)
+                    if len(versions) > 1:
+                        labels = [f"v{version} ({cid})" for cid, version, _ in versions]
+                        compare_old = st.selectbox("Compare From", labels, index=1)
+                        compare_new = st.selectbox("Compare To", labels, index=0)
+                        st.dataframe(diff_versions(ipfs_client, versions[labels.index(compare_old)][0],
+                                                   versions[labels.index(compare_new)][0]), hide_index=True)
+                except Exception as history_error:
+                    st.error(f"Error loading version history: {str(history_error)}")
         
         if st.button("Update Trial"):
             try:
                 updated_df = pd.DataFrame(updated_data, index=[0])
                 if additional_notes:
                     updated_df['Additional Notes'] = additional_notes
-                new_ipfs_hash = add_csv_to_ipfs(updated_df)
+                # Stored as a patch against the current version rather than a full re-upload
+                new_ipfs_hash = write_update(ipfs_client, trial[2], updated_df)
                 status_map = {"Active": 0, "Completed": 1, "Suspended": 2}
-                with st.spinner("Updating trial..."):
-                    tx_receipt = update_trial(trial_id, new_ipfs_hash, status_map[new_status], selected_account)
-                st.success(f"Trial updated successfully. New IPFS Hash: {new_ipfs_hash}")
+                tx_hash = submit_update_trial(trial[0], new_ipfs_hash, status_map[new_status], selected_account)
+                # The next edit must patch this version, not the one originally fetched
+                st.session_state.trial = (trial[0], trial[1], new_ipfs_hash, status_map[new_status], *trial[4:])
+                st.session_state.current_trial_data = updated_df
+                st.success(f"Trial update submitted. New IPFS Hash: {new_ipfs_hash}. Transaction: {tx_hash}")
             except Exception as e:
                 st.error(f"Error updating trial: {str(e)}")
 
@@ -193,11 +347,51 @@ with tab2:
 with tab3:
     st.header("View Trials")
     
+    # Re-render when the live feed reports new or updated trials
+    @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+    def live_status():
+        st.caption(f"Live updates: {live_feed.mode}, block {live_feed.head}")
+        seen_version = st.session_state.get('live_feed_version')
+        st.session_state.live_feed_version = live_feed.version
+        if st.session_state.get('auto_refresh') and seen_version is not None and seen_version != live_feed.version:
+            st.rerun()
+
+    st.checkbox("Auto-refresh when trials change", key='auto_refresh')
+    live_status()
+
     try:
-        trial_count = get_trial_count()
+        if live_feed.mode != WEBSOCKET:
+            sync_trial_index(latest_block_number())
+        trial_count = trial_indexer.count_trials()
         st.info(f"Total Number of Trials: {trial_count}")
     except Exception as e:
-        st.error(f"Error fetching trial count: {str(e)}")
+        st.error(f"Error syncing trial index: {str(e)}")
+
+    # Filters are answered from the local index instead of scanning every trial on-chain
+    status_names = ['Active', 'Completed', 'Suspended']
+    filter_cols = st.columns(3)
+    status_filter = filter_cols[0].multiselect("Filter by Status", status_names)
+    researcher_filter = filter_cols[1].text_input("Filter by Researcher")
+    patient_filter = filter_cols[2].text_input("Filter by Patient ID")
+    trial_filters = {
+        'status': [status_names.index(name) for name in status_filter] or None,
+        'researcher': researcher_filter or None,
+        'patient_id': patient_filter or None,
+    }
+    try:
+        listed = trial_indexer.list_trials(limit=500, **trial_filters)
+        if listed:
+            st.dataframe(pd.DataFrame([{
+                "Trial ID": trial[0],
+                "Patient ID": trial[1],
+                "IPFS Hash": trial[2],
+                "Status": status_names[trial[3]],
+                "Researcher": trial[4],
+                "Start Date": datetime.fromtimestamp(trial[5]),
+                "Last Updated": datetime.fromtimestamp(trial[6]),
+            } for trial in listed]))
+    except Exception as e:
+        st.error(f"Error listing trials: {str(e)}")
     
     trial_id_view = st.number_input("Enter Trial ID to view", min_value=1, step=1, help="Enter the Trial ID to fetch details.")
     
@@ -223,55 +417,185 @@ with tab3:
         except Exception as e:
             st.error(f"Error viewing trial: {str(e)}")
 
-    if st.button("Download All Trials"):
+    # Anchored records are not registered as individual trials, so they are listed from the anchorer
+    with st.expander("Anchored Records"):
+        anchored_records = anchorer.list_records(limit=500)
+        if anchored_records:
+            st.dataframe(pd.DataFrame([{
+                "Patient ID": record['label'],
+                "IPFS Hash": record['cid'],
+                "State": record['state'],
+                "Batch": record['batch_id'],
+            } for record in anchored_records]), hide_index=True)
+            anchored_cid = st.selectbox("Anchored Record", [record['cid'] for record in anchored_records
+                                                            if record['state'] == ANCHORED])
+            verify_col, show_col = st.columns(2)
+            if anchored_cid and verify_col.button("Verify On-Chain"):
+                try:
+                    if anchorer.verify(anchored_cid):
+                        st.success(f"Record is included in anchored batch {anchorer.proof(anchored_cid)['batch_id']}.")
+                    else:
+                        st.error("Record could not be verified against an anchored root.")
+                except Exception as e:
+                    st.error(f"Error verifying record: {str(e)}")
+            if anchored_cid and show_col.button("Show Record"):
+                try:
+                    st.dataframe(get_csv_from_ipfs(anchored_cid))
+                except Exception as ipfs_error:
+                    st.error(f"Error retrieving data from IPFS: {str(ipfs_error)}")
+        else:
+            st.caption("No records have been queued for anchoring.")
+
+    export_format = st.selectbox("Export Format", list(EXPORT_FORMATS), help="Compressed formats are recommended for large studies.")
+    trace_export = st.checkbox("Trace export", help="Record a per-stage timing breakdown, shown under Debug Information.")
+    # The export follows the filters above; the labels and file name say so whenever one is set
+    filtered = any(value is not None for value in trial_filters.values())
+    export_scope = "filtered trials" if filtered else "all trials"
+    if filtered:
+        st.caption("Export is limited to trials matching the filters above.")
+    if st.button(f"Download {export_scope.title()}"):
         try:
-            all_trials = []
-            for i in range(1, trial_count + 1):
-                trial = get_trial(i)
-                if trial[2]:
-                    try:
-                        df = get_csv_from_ipfs(trial[2])
-                        df["Trial ID"] = trial[0]
-                        df["Status"] = ['Active', 'Completed', 'Suspended'][trial[3]]
-                        df["Researcher"] = trial[4]
-                        df["Start Date"] = datetime.fromtimestamp(trial[5])
-                        df["Last Updated"] = datetime.fromtimestamp(trial[6])
-                        all_trials.append(df)
-                    except Exception as ipfs_error:
-                        st.warning(f"Could not retrieve data for Trial ID {trial[0]}: {str(ipfs_error)}")
-                else:
-                    st.warning(f"No data available for Trial ID {trial[0]}")
-            
-            if all_trials:
-                all_trials_df = pd.concat(all_trials, ignore_index=True)
-                csv = all_trials_df.to_csv(index=False)
-                
+            def trials_with_data():
+                with span('export.list'):
+                    indexed_trials = trial_indexer.list_trials(**trial_filters)
+                for trial in indexed_trials:
+                    if trial[2]:
+                        yield trial
+                    else:
+                        st.warning(f"No data available for Trial ID {trial[0]}")
+
+            def report_error(trial, ipfs_error):
+                st.warning(f"Could not retrieve data for Trial ID {trial[0]}: {str(ipfs_error)}")
+
+            file_name, mime = EXPORT_FORMATS[export_format]
+            if filtered:
+                file_name = file_name.replace("all_trials", "filtered_trials")
+            # Sessions share one process, so every export gets its own temporary file
+            export_fd, export_path = tempfile.mkstemp(prefix="medchain_export_", suffix=f"_{file_name}")
+            os.close(export_fd)
+            try:
+                with st.spinner("Exporting trials..."), (trace('export', format=export_format) if trace_export else nullcontext()):
+                    row_count = write_export(trials_with_data(), export_path, export_format, on_error=report_error)
+                # st.download_button holds its payload in memory; only the export itself is streamed
+                export_data = None
+                if row_count:
+                    with open(export_path, 'rb') as export_file:
+                        export_data = export_file.read()
+            finally:
+                os.remove(export_path)
+
+            if export_data is not None:
                 st.download_button(
-                    label="Download all trials as CSV",
-                    data=csv,
-                    file_name='all_trials.csv',
-                    mime='text/csv'
+                    label=f"Download {export_scope} as {export_format}",
+                    data=export_data,
+                    file_name=file_name,
+                    mime=mime
                 )
             else:
                 st.warning("No trial data available to download.")
         except Exception as e:
-            st.error(f"Error downloading all trials: {str(e)}")
+            st.error(f"Error downloading {export_scope}: {str(e)}")
 
 # Tab 4: Upload Dataset
 with tab4:
     st.header("Upload a Dataset")
+    upload_mode = st.radio("Upload Mode", ["Store Dataset", "Bulk Enrollment"], horizontal=True,
+                           help="Bulk Enrollment registers one trial per patient row.")
     uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
     
-    if uploaded_file is not None:
+    if uploaded_file is not None and upload_mode == "Store Dataset":
         try:
-            # Read CSV and display it
-            dataset = pd.read_csv(uploaded_file)
-            st.dataframe(dataset)
+            # Scan the CSV in chunks and show only a bounded preview; the scan is kept per upload,
+            # so reruns from unrelated widgets do not read the whole file again
+            if st.session_state.get('csv_scan_file_id') != uploaded_file.file_id:
+                st.session_state.csv_scan = scan_csv(uploaded_file)
+                st.session_state.csv_scan_file_id = uploaded_file.file_id
+            scan = st.session_state.csv_scan
+            st.info(f"{scan['row_count']} rows, {len(scan['columns'])} columns. Showing the first {len(scan['preview'])} rows.")
+            st.dataframe(scan['preview'])
+            with st.expander("Inferred Schema"):
+                st.write(scan['schema'])
             
-            # Add dataset to IPFS
+            # Add dataset to IPFS; columnar formats keep column types and are compressed
+            payload_format = st.selectbox("Storage Format", PAYLOAD_FORMATS, index=PAYLOAD_FORMATS.index(PARQUET),
+                                          help="Parquet and Arrow are typed and compressed; CSV is plain text.")
             if st.button("Upload Dataset to IPFS"):
+                coerced = {}
                 with st.spinner("Uploading dataset to IPFS..."):
-                    ipfs_hash = add_csv_to_ipfs(dataset)
+                    with tempfile.NamedTemporaryFile(suffix=f".{payload_format}") as converted:
+                        ipfs_hash = upload_csv(ipfs_client, uploaded_file, payload_format, scan['schema'], converted.name,
+                                               coerced=coerced)
                     st.success(f"Dataset uploaded to IPFS successfully! IPFS Hash: {ipfs_hash}")
+                if coerced:
+                    st.warning("Some values did not match the inferred column types and were stored as missing: "
+                               + ", ".join(f"{column} ({count})" for column, count in coerced.items()))
         except Exception as e:
             st.error(f"Error uploading dataset: {str(e)}")
+
+    if uploaded_file is not None and upload_mode == "Bulk Enrollment":
+        try:
+            roster = read_roster(uploaded_file)
+            row_errors = validate_trials(roster)
+            invalid = row_errors != ""
+            st.info(f"{len(roster) - int(invalid.sum())} of {len(roster)} patients passed validation.")
+            if invalid.any():
+                st.warning("Rows with errors will be skipped.")
+                st.dataframe(roster[invalid].assign(Errors=row_errors[invalid]))
+            valid_roster = roster[~invalid]
+
+            if len(valid_roster) and st.button(f"Enroll {len(valid_roster)} Patients"):
+                records = build_trial_records(valid_roster)
+                with st.spinner("Uploading patient records to IPFS..."):
+                    uploads = ipfs_client.add_many(records)
+                enrolled = [(patient_id, ipfs_hash) for patient_id, (ipfs_hash, upload_error)
+                            in zip(valid_roster["Patient ID"].astype(str), uploads) if upload_error is None]
+                for patient_id, (ipfs_hash, upload_error) in zip(valid_roster["Patient ID"], uploads):
+                    if upload_error is not None:
+                        st.warning(f"Could not upload record for Patient ID {patient_id}: {str(upload_error)}")
+                if enrolled:
+                    patient_ids, ipfs_hashes = zip(*enrolled)
+                    tx_hashes = submit_create_trials(patient_ids, ipfs_hashes, selected_account)
+                    st.success(f"Submitted {len(enrolled)} patients in {len(tx_hashes)} transaction(s).")
+        except Exception as e:
+            st.error(f"Error enrolling patients: {str(e)}")
+
+# Tab 5: Cohort Analytics
+with tab5:
+    st.header("Cohort Analytics")
+    cohort_analytics = get_cohort_analytics()
+    # Records are folded in off the script thread, and only after the index has moved
+    cohort_analytics.refresh(trial_indexer.list_trials, trial_indexer.last_block)
+
+    @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+    def analytics_status():
+        if cohort_analytics.refreshing():
+            st.caption("Loading new trial records in the background...")
+            st.session_state.analytics_loading = True
+        elif st.session_state.pop('analytics_loading', False):
+            st.rerun()
+
+    analytics_status()
+    if cohort_analytics.last_error:
+        st.error(f"Error loading trial records: {cohort_analytics.last_error}")
+    if cohort_analytics.errors:
+        st.warning(f"{len(cohort_analytics.errors)} trial records could not be retrieved from IPFS; "
+                   f"they are retried every {FAILED_RETRY_SECONDS // 60} minutes.")
+    try:
+        st.info(f"Trials analysed: {len(cohort_analytics.rows)}")
+
+        group_by = st.multiselect("Group By", GROUP_KEYS, default=["Disease"])
+        measures = st.multiselect("Measures", MEASURES, default=MEASURES)
+        if group_by and measures:
+            st.dataframe(cohort_analytics.summary(by=group_by, measures=measures))
+
+        st.subheader("Distribution")
+        distribution_cols = st.columns(2)
+        measure = distribution_cols[0].selectbox("Measure", MEASURES)
+        split_by = distribution_cols[1].selectbox("Split By", ["None"] + GROUP_KEYS)
+        distribution = cohort_analytics.distribution(measure, by=None if split_by == "None" else split_by)
+        if distribution.empty:
+            st.warning(f"No values recorded for {measure}.")
+        else:
+            st.bar_chart(distribution)
+    except Exception as e:
+        st.error(f"Error computing analytics: {str(e)}")
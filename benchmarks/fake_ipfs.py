@@ -0,0 +1,95 @@
+# fake_ipfs.py
+# Minimal in-process stand-in for the IPFS HTTP API (/add, /cat, /version) with configurable latency.
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from cid import b58encode, SHA2_256_PREFIX
+
+
+# CIDv0-shaped hash of the raw bytes (not a real UnixFS CID, but stable and convertible to bytes32)
+def fake_cid(data):
+    return b58encode(SHA2_256_PREFIX + hashlib.sha256(data).digest())
+
+
+class FakeIPFS:
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.blocks = {}
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def api_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/api/v0'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _read_body(self):
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    body = bytearray()
+                    while True:
+                        size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return bytes(body)
+                        body += self.rfile.read(size)
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def _reply(self, status, payload, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = self._read_body()
+                fake.requests += 1
+                fake.bytes_in += len(body)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlparse(self.path)
+                if url.path.endswith('/add'):
+                    boundary = self.headers['Content-Type'].split('boundary=')[1].strip('"').encode()
+                    part = body.split(b'--' + boundary)[1]
+                    data = part.split(b'\r\n\r\n', 1)[1][:-2]  # strip the CRLF before the next boundary
+                    cid = fake_cid(data)
+                    fake.blocks[cid] = data
+                    self._reply(200, json.dumps({'Name': 'data', 'Hash': cid, 'Size': str(len(data))}).encode())
+                elif url.path.endswith('/cat'):
+                    cid = parse_qs(url.query).get('arg', [''])[0]
+                    if cid not in fake.blocks:
+                        self._reply(500, json.dumps({'Message': f'block not found: {cid}'}).encode())
+                        return
+                    fake.bytes_out += len(fake.blocks[cid])
+                    self._reply(200, fake.blocks[cid], 'application/octet-stream')
+                elif url.path.endswith('/version'):
+                    self._reply(200, json.dumps({'Version': 'fake-ipfs'}).encode())
+                else:
+                    self._reply(404, b'{"Message": "not found"}')
+
+        return Handler
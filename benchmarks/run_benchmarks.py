@@ -0,0 +1,243 @@
+# run_benchmarks.py
+# End-to-end benchmarks of the trial hot paths against an in-process EVM (eth-tester/py-evm) running the
+# ClinicalTrials contract and a local fake of the IPFS HTTP API. Results are written as JSON.
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+
+import pandas as pd  # noqa: E402
+from fake_ipfs import FakeIPFS  # noqa: E402
+
+DEFAULT_COUNTS = [10, 100, 1000, 10000, 100000]
+SAMPLE_OPS = 200  # individually timed create/update/get operations per trial count
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        'mean': sum(ordered) / len(ordered) * 1000,
+        'p50': pick(0.50),
+        'p90': pick(0.90),
+        'p99': pick(0.99),
+        'max': ordered[-1] * 1000,
+    }
+
+
+def result(operation, trials, elapsed, ops, latencies=None, **extra):
+    entry = {
+        'operation': operation,
+        'trials': trials,
+        'ops': ops,
+        'seconds': elapsed,
+        'throughput_per_s': ops / elapsed if elapsed else None,
+        'latency_ms': percentiles(latencies or []),
+    }
+    entry.update(extra)
+    return entry
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+
+def trial_record(n):
+    return pd.DataFrame({
+        "Trial Name": [f"Trial ID {n} - Patient {n} - Diabetes"],
+        "Disease": ["Diabetes"],
+        "Patient ID": [f"P{n:06d}"],
+        "Patient Name": [f"Patient {n}"],
+        "Date of Birth": [date(1970 + n % 40, 1 + n % 12, 1)],
+        "Age": [20 + n % 60],
+        "Gender": [["Male", "Female", "Other"][n % 3]],
+        "Condition": ["Type 2"],
+        "Treatment Group": [["Control", "Experimental"][n % 2]],
+        "Medication": ["Metformin"],
+        "Dosage": [f"{250 * (1 + n % 4)} mg"],
+        "Start Date": [date(2024, 1, 1)],
+        "Expected End Date": [date(2025, 1, 1)],
+        "Blood Sugar Level": [80 + n % 300],
+    })
+
+
+# Deploy the contract on eth-tester inside workdir and point interact_with_contract at it
+def setup_chain(workdir, use_compiled):
+    from web3 import Web3, EthereumTesterProvider
+    import deploy_contract
+
+    os.chdir(workdir)
+    w3 = Web3(EthereumTesterProvider())
+    if use_compiled:
+        # Deploy the committed build as-is (no Solidity compiler needed)
+        with open(os.path.join(REPO_ROOT, deploy_contract.COMPILED_FILE), 'r') as file:
+            compiled_sol = json.load(file)
+    else:
+        compiled_sol = deploy_contract.compile_contract()
+    deploy_contract.deploy(w3, compiled_sol, force=True)
+
+    # Imported only now so it loads the manifest just written; then rebind it to the in-process chain
+    import interact_with_contract as chain
+    from tx_manager import TransactionManager
+    chain.web3 = w3
+    chain.contract = w3.eth.contract(address=chain.contract_address, abi=chain.abi)
+    chain.transaction_manager = TransactionManager(w3, poll_interval=0.01)
+    return chain
+
+
+# Register trials until the chain holds `target`, through the batch path
+def seed(chain, ipfs_client, target, account):
+    current = chain.get_trial_count()
+    if current >= target:
+        return None
+    records = [trial_record(n) for n in range(current + 1, target + 1)]
+    start = time.perf_counter()
+    hashes = []
+    for offset in range(0, len(records), 1000):
+        for ipfs_hash, error in ipfs_client.add_many(records[offset:offset + 1000]):
+            if error is not None:
+                raise error
+            hashes.append(ipfs_hash)
+    patient_ids = [record["Patient ID"].iloc[0] for record in records]
+    for tx_hash in chain.submit_create_trials(patient_ids, hashes, account):
+        chain.transaction_manager.wait(tx_hash)
+    return result('seed', target, time.perf_counter() - start, len(records))
+
+
+def bench_create(chain, ipfs_client, trials, account, samples):
+    latencies = []
+    start = time.perf_counter()
+    for n in range(samples):
+        begin = time.perf_counter()
+        ipfs_hash = ipfs_client.add_csv(trial_record(trials + n + 1))
+        chain.create_trial(f"P{trials + n + 1:06d}", ipfs_hash, account)
+        latencies.append(time.perf_counter() - begin)
+    return result('create', trials, time.perf_counter() - start, samples, latencies)
+
+
+def bench_update(chain, ipfs_client, trials, account, samples, rng):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(samples):
+        trial_id = rng.randint(1, trials)
+        begin = time.perf_counter()
+        record = trial_record(trial_id)
+        record["Additional Notes"] = f"Visit {rng.random():.6f}"
+        ipfs_hash = ipfs_client.add_csv(record)
+        chain.update_trial(trial_id, ipfs_hash, 0, account)
+        latencies.append(time.perf_counter() - begin)
+    return result('update', trials, time.perf_counter() - start, samples, latencies)
+
+
+def bench_get(chain, trials, samples, rng):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(samples):
+        _, elapsed = timed(chain.get_trial, rng.randint(1, trials))
+        latencies.append(elapsed)
+    single = result('get', trials, time.perf_counter() - start, samples, latencies)
+    all_trials, elapsed = timed(chain.get_trial_range, 1, trials)
+    return [single, result('get_range', trials, elapsed, len(all_trials))], all_trials
+
+
+def bench_export(export, ipfs_client, all_trials, workdir):
+    path = os.path.join(workdir, 'export.csv')
+    rows, elapsed = timed(export.write_export, all_trials, path, 'csv', client=ipfs_client)
+    return result('export', len(all_trials), elapsed, rows, bytes=os.path.getsize(path))
+
+
+def bench_upload(ingest, ipfs_client, trials):
+    frame = pd.concat([trial_record(n) for n in range(min(trials, 1000))], ignore_index=True)
+    dataset = pd.concat([frame] * max(1, trials // len(frame)), ignore_index=True).head(trials)
+    data = dataset.to_csv(index=False).encode('utf-8')
+    _, elapsed = timed(ingest.upload_csv, ipfs_client, io.BytesIO(data))
+    return result('upload', trials, elapsed, 1, [elapsed], rows=len(dataset), bytes=len(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MedChainTrials hot paths against local stand-ins.")
+    parser.add_argument('--counts', default=','.join(map(str, DEFAULT_COUNTS)),
+                        help="Comma-separated trial counts to benchmark at (ascending)")
+    parser.add_argument('--samples', type=int, default=SAMPLE_OPS, help="Timed create/update/get operations per count")
+    parser.add_argument('--ipfs-latency-ms', type=float, default=0.0, help="Latency added to every fake IPFS request")
+    parser.add_argument('--use-compiled', action='store_true',
+                        help="Deploy the committed compiled_code.json instead of compiling the current source")
+    parser.add_argument('--output', help="Write results JSON here instead of stdout")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for sampled trial IDs")
+    args = parser.parse_args()
+
+    counts = sorted(int(count) for count in args.counts.split(','))
+    output = os.path.abspath(args.output) if args.output else None
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='medchain-bench-')
+
+    fake = FakeIPFS(latency=args.ipfs_latency_ms / 1000).start()
+    try:
+        chain = setup_chain(workdir, args.use_compiled)
+        import export
+        import ingest
+        from ipfs import IPFSClient
+        import web3 as web3_module
+
+        # Uncached client so every read goes to the (fake) daemon
+        ipfs_client = IPFSClient(api_url=fake.api_url)
+        account = chain.get_accounts()[0]
+
+        results = []
+        for count in counts:
+            seeded = seed(chain, ipfs_client, count, account)
+            if seeded:
+                results.append(seeded)
+            trials = chain.get_trial_count()
+            samples = min(args.samples, count)
+            results.append(bench_update(chain, ipfs_client, trials, account, samples, rng))
+            get_results, all_trials = bench_get(chain, trials, samples, rng)
+            results.extend(get_results)
+            results.append(bench_export(export, ipfs_client, all_trials, workdir))
+            results.append(bench_upload(ingest, ipfs_client, count))
+            results.append(bench_create(chain, ipfs_client, trials, account, samples))
+            print(f"benchmarked {count} trials", file=sys.stderr)
+
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'web3': web3_module.__version__,
+                'pandas': pd.__version__,
+                'contract_stores_cid_digests': chain.stores_cid_digests,
+                'ipfs_latency_ms': args.ipfs_latency_ms,
+                'samples': args.samples,
+            },
+            'results': results,
+        }
+    finally:
+        fake.stop()
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+# bulk_import.py
+# Headless bulk enrollment: every CSV roster under a directory is parsed and validated across a process
+# pool, one record per patient is uploaded to IPFS concurrently, and trials are registered through the
+# shared nonce-ordered transaction manager. Progress is checkpointed to a SQLite journal so an
+# interrupted import can be rerun and resumes without registering any patient twice.
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from web3.exceptions import TimeExhausted
+from interact_with_contract import (web3, has_function, submit_create_trial, submit_create_trials, transaction_manager,
+                                    CREATE_BATCH_SIZE)
+from ipfs import client as default_client
+from tx_manager import CONFIRMED, FAILED
+from validation import build_trial_records, parse_roster_file
+
+DEFAULT_JOURNAL_PATH = 'bulk_import.db'
+UPLOAD_BATCH_SIZE = 256  # records uploaded per add_many call
+REPORT_INTERVAL = 5  # seconds between progress lines
+RESUME_RECEIPT_TIMEOUT = 30  # seconds to wait for a transaction left pending by an interrupted run
+
+# Record states; a record only moves forward except when a submission is found not to have happened
+UPLOADED = 'uploaded'
+SUBMITTING = 'submitting'  # journaled just before submission, so a crash leaves it ambiguous
+SUBMITTED = 'submitted'
+REGISTERED = 'registered'
+REJECTED = 'rejected'  # the registering transaction reverted
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    invalid_rows INTEGER NOT NULL,
+    errors TEXT NOT NULL,
+    imported REAL
+);
+CREATE TABLE IF NOT EXISTS records (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_sha256 TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    patient_id TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    state TEXT NOT NULL,
+    tx_hash TEXT,
+    error TEXT,
+    UNIQUE (file_sha256, row)
+);
+CREATE INDEX IF NOT EXISTS records_state ON records (state);
+'''
+
+
+class ImportJournal:
+    # Checkpoint of which files were imported and how far each patient record got
+    def __init__(self, db_path=DEFAULT_JOURNAL_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    # A file is skipped when it was fully imported and has not changed since
+    def file_done(self, path):
+        stat = os.stat(path)
+        with self.lock:
+            row = self.conn.execute('SELECT size, mtime FROM files WHERE path = ? AND imported IS NOT NULL',
+                                    (path,)).fetchone()
+        return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+    def recorded_rows(self, file_sha256):
+        with self.lock:
+            return {row for (row,) in self.conn.execute('SELECT row FROM records WHERE file_sha256 = ?', (file_sha256,))}
+
+    def add_records(self, records):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO records (file_sha256, row, patient_id, cid, state) VALUES (?, ?, ?, ?, ?)',
+                [(sha, row, patient_id, cid, UPLOADED) for sha, row, patient_id, cid in records])
+
+    def finish_file(self, result, imported):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (
+                result['path'], result['size'], result['mtime'], result['sha256'], result['rows'],
+                len(result['errors']), json.dumps(result['errors']), time.time() if imported else None))
+
+    # Oldest uploaded records first, so trials are registered in the order their records were built
+    def take_unsubmitted(self, limit):
+        with self.lock, self.conn:
+            rows = self.conn.execute('SELECT seq, patient_id, cid FROM records WHERE state = ? ORDER BY seq LIMIT ?',
+                                     (UPLOADED, limit)).fetchall()
+            self.conn.executemany('UPDATE records SET state = ? WHERE seq = ?', [(SUBMITTING, seq) for seq, _, _ in rows])
+        return rows
+
+    def set_state(self, seqs, state, tx_hash=None, error=None):
+        with self.lock, self.conn:
+            self.conn.executemany('UPDATE records SET state = ?, tx_hash = ?, error = ? WHERE seq = ?',
+                                  [(state, tx_hash, error, seq) for seq in seqs])
+
+    def records_in(self, state):
+        with self.lock:
+            return self.conn.execute('SELECT seq, patient_id, cid, tx_hash FROM records WHERE state = ? ORDER BY seq',
+                                     (state,)).fetchall()
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute('SELECT state, COUNT(*) FROM records GROUP BY state').fetchall())
+
+
+class BulkImporter:
+    def __init__(self, journal, account, client=None, workers=None, upload_batch_size=UPLOAD_BATCH_SIZE,
+                 batch_size=CREATE_BATCH_SIZE, report_interval=REPORT_INTERVAL, out=sys.stdout):
+        self.journal = journal
+        self.account = account
+        self.client = client or default_client
+        self.workers = workers or os.cpu_count() or 1
+        self.upload_batch_size = upload_batch_size
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+        self.out = out
+        self.stats = {'files': 0, 'files_total': 0, 'rows': 0, 'invalid': 0, 'uploaded': 0,
+                      'upload_errors': 0, 'submitted': 0, 'registered': 0, 'rejected': 0}
+        self.in_flight = {}  # tx hash -> journal seqs awaiting a receipt
+        self.started = None
+        self.last_report = 0
+
+    # Settle records an interrupted run left submitting or submitted, before anything new is sent
+    def resume(self, indexer=None):
+        for seq, patient_id, cid, tx_hash in self.journal.records_in(SUBMITTED):
+            self.in_flight.setdefault(tx_hash, []).append(seq)
+        for tx_hash, seqs in list(self.in_flight.items()):
+            try:
+                receipt = transaction_manager.wait(tx_hash, timeout=RESUME_RECEIPT_TIMEOUT)
+            except TimeExhausted:
+                continue  # Dropped: checked against the chain below like a crash mid-submission
+            del self.in_flight[tx_hash]
+            if receipt['status'] == 1:
+                self.journal.set_state(seqs, REGISTERED, tx_hash)
+            else:
+                self.journal.set_state(seqs, REJECTED, tx_hash, error='Transaction reverted')
+
+        ambiguous = self.journal.records_in(SUBMITTING)
+        dropped = [seq for seqs in self.in_flight.values() for seq in seqs]
+        self.in_flight.clear()
+        if not ambiguous and not dropped:
+            return
+        # Whether these made it on-chain is unknown: look their CIDs up in the event index
+        if indexer is None:
+            from indexer import TrialIndexer
+            indexer = TrialIndexer()
+        indexer.sync()
+        dropped = set(dropped)
+        unsettled = ambiguous + [row for row in self.journal.records_in(SUBMITTED) if row[0] in dropped]
+        for seq, patient_id, cid, tx_hash in unsettled:
+            if any(trial[2] == cid for trial in indexer.list_trials(patient_id=patient_id)):
+                self.journal.set_state([seq], REGISTERED, tx_hash)
+            else:
+                self.journal.set_state([seq], UPLOADED)
+
+    def run(self, paths):
+        self.started = time.time()
+        todo = [path for path in paths if not self.journal.file_done(path)]
+        self.stats['files_total'] = len(todo)
+        self.print(f"{len(paths)} CSV files found, {len(paths) - len(todo)} already imported")
+        pending_uploads = []
+        files = {}  # path -> (parse result, rows still to upload, failed upload seen)
+
+        # Workers only parse and validate; spawning them keeps the parent's chain connection out of the pool
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            queue = iter(todo)
+            running = {}
+            while True:
+                # Keep a bounded window of files in flight so parsed rosters do not pile up in memory
+                while len(running) < self.workers * 2:
+                    path = next(queue, None)
+                    if path is None:
+                        break
+                    running[pool.submit(parse_roster_file, path)] = path
+                if not running:
+                    break
+                done, _ = wait(running, timeout=self.report_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.stats['files'] += 1
+                        self.print(f"{path}: could not be read: {e}")
+                        continue
+                    self._queue_file(result, files, pending_uploads)
+                    if len(pending_uploads) >= self.upload_batch_size:
+                        self._upload(pending_uploads, files)
+                        pending_uploads = []
+                self._submit(flush=False)
+                self._poll()
+                self.report()
+
+        if pending_uploads:
+            self._upload(pending_uploads, files)
+        self._submit(flush=True)
+        # Settled from the receipts directly: the manager's background poller may not have seen them yet
+        for tx_hash in list(self.in_flight):
+            try:
+                receipt = transaction_manager.wait(tx_hash)
+            except TimeExhausted:
+                self.print(f"Transaction {tx_hash} still pending; rerun to settle it")
+                continue
+            self._settle(tx_hash, receipt)
+        self.report(final=True)
+        return self.stats
+
+    def _queue_file(self, result, files, pending_uploads):
+        self.stats['files'] += 1
+        if result['valid'] is None:
+            self.print(f"{result['path']}: could not be parsed: {result['errors']['file']}")
+            self.journal.finish_file(result, imported=False)
+            return
+        self.stats['rows'] += result['rows']
+        self.stats['invalid'] += len(result['errors'])
+        # Rows journaled by an earlier, interrupted run of the same file are not uploaded again
+        valid = result['valid']
+        valid = valid[~valid.index.isin(self.journal.recorded_rows(result['sha256']))]
+        if valid.empty:
+            self.journal.finish_file(result, imported=True)
+            return
+        records = build_trial_records(valid)
+        files[result['path']] = [result, len(records), False]
+        for row, patient_id, record in zip(valid.index, valid["Patient ID"].astype(str), records):
+            pending_uploads.append((result['path'], int(row), patient_id, record))
+
+    def _upload(self, pending_uploads, files):
+        uploads = self.client.add_many(record for _, _, _, record in pending_uploads)
+        journaled = []
+        for (path, row, patient_id, _), (cid, error) in zip(pending_uploads, uploads):
+            entry = files[path]
+            entry[1] -= 1
+            if error is not None:
+                entry[2] = True
+                self.stats['upload_errors'] += 1
+                self.print(f"{path} row {row}: upload failed: {error}")
+            else:
+                journaled.append((entry[0]['sha256'], row, patient_id, cid))
+        self.journal.add_records(journaled)
+        self.stats['uploaded'] += len(journaled)
+        for path, (result, remaining, failed) in list(files.items()):
+            if remaining == 0:
+                # Files with failed uploads stay unfinished so the next run retries the missing rows
+                self.journal.finish_file(result, imported=not failed)
+                del files[path]
+
+    # Send full createTrials batches (and the remainder when flushing) through the shared submitter
+    def _submit(self, flush):
+        while True:
+            counts = self.journal.counts()
+            if counts.get(UPLOADED, 0) < (1 if flush else self.batch_size):
+                return
+            rows = self.journal.take_unsubmitted(self.batch_size)
+            seqs = [seq for seq, _, _ in rows]
+            if has_function('createTrials'):
+                try:
+                    [tx_hash] = submit_create_trials([row[1] for row in rows], [row[2] for row in rows], self.account,
+                                                     batch_size=self.batch_size)
+                except Exception:
+                    self.journal.set_state(seqs, UPLOADED)  # Nothing was sent
+                    raise
+                self._sent(seqs, tx_hash)
+                continue
+            # Older deployments take one createTrial per record; each is journaled as soon as it is sent
+            for index, (seq, patient_id, cid) in enumerate(rows):
+                try:
+                    tx_hash = submit_create_trial(patient_id, cid, self.account)
+                except Exception:
+                    self.journal.set_state(seqs[index:], UPLOADED)  # Only the records not yet sent
+                    raise
+                self._sent([seq], tx_hash)
+
+    def _sent(self, seqs, tx_hash):
+        self.journal.set_state(seqs, SUBMITTED, tx_hash)
+        self.in_flight[tx_hash] = seqs
+        self.stats['submitted'] += len(seqs)
+
+    def _poll(self):
+        for tx_hash in list(self.in_flight):
+            record = transaction_manager.status(tx_hash)
+            if record is None or record['state'] not in (CONFIRMED, FAILED):
+                continue
+            if record['receipt'] is not None:
+                self._settle(tx_hash, record['receipt'], error=record['error'])
+            else:
+                # A dropped transaction stays journaled as submitted and is settled on the next run
+                del self.in_flight[tx_hash]
+
+    # Record the outcome of a mined transaction and stop tracking it
+    def _settle(self, tx_hash, receipt, error=None):
+        seqs = self.in_flight.pop(tx_hash)
+        if receipt['status'] == 1:
+            self.journal.set_state(seqs, REGISTERED, tx_hash)
+            self.stats['registered'] += len(seqs)
+        else:
+            self.journal.set_state(seqs, REJECTED, tx_hash, error=error or 'Transaction reverted')
+            self.stats['rejected'] += len(seqs)
+            self.print(f"Transaction {tx_hash} reverted; {len(seqs)} records marked rejected")
+
+    def report(self, final=False):
+        now = time.time()
+        if not final and now - self.last_report < self.report_interval:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        s = self.stats
+        self.print(f"[{elapsed:7.1f}s] files {s['files']}/{s['files_total']}  rows {s['rows']} ({s['rows'] / elapsed:.1f}/s)  "
+                   f"invalid {s['invalid']}  uploaded {s['uploaded']} ({s['uploaded'] / elapsed:.1f}/s)  "
+                   f"submitted {s['submitted']}  registered {s['registered']} ({s['registered'] / elapsed:.1f}/s)"
+                   + (f"  upload errors {s['upload_errors']}" if s['upload_errors'] else '')
+                   + (f"  rejected {s['rejected']}" if s['rejected'] else ''))
+
+    def print(self, message):
+        print(message, file=self.out, flush=True)
+
+
+def find_csv_files(directory):
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith('.csv'))
+    return sorted(paths)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk-enroll patients from a directory of CSV rosters.")
+    parser.add_argument('directory', help="Directory searched recursively for .csv files")
+    parser.add_argument('--account', help="Researcher account registering the trials (defaults to the first node account)")
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL_PATH, help="Checkpoint database used to resume an import")
+    parser.add_argument('--workers', type=int, help="Parser processes (defaults to the CPU count)")
+    parser.add_argument('--batch-size', type=int, default=CREATE_BATCH_SIZE, help="Patients per createTrials transaction")
+    parser.add_argument('--upload-batch-size', type=int, default=UPLOAD_BATCH_SIZE, help="Records per concurrent IPFS upload batch")
+    parser.add_argument('--retry-rejected', action='store_true', help="Resubmit records whose transaction reverted")
+    args = parser.parse_args()
+
+    journal = ImportJournal(args.journal)
+    if args.retry_rejected:
+        journal.set_state([seq for seq, _, _, _ in journal.records_in(REJECTED)], UPLOADED)
+    importer = BulkImporter(journal, args.account or web3.eth.accounts[0], workers=args.workers,
+                            upload_batch_size=args.upload_batch_size, batch_size=args.batch_size)
+    importer.resume()
+    stats = importer.run(find_csv_files(args.directory))
+    counts = journal.counts()
+    pending = counts.get(SUBMITTED, 0) + counts.get(UPLOADED, 0)
+    print(f"Imported {stats['registered']} patients from {stats['files']} files; "
+          f"{stats['invalid']} invalid rows skipped" + (f"; {pending} records left for the next run" if pending else ''))
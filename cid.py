@@ -0,0 +1,46 @@
+# cid.py
+# Conversion between IPFS CIDv0 strings ("Qm...") and the 32-byte sha2-256 digests stored on-chain
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+SHA2_256_PREFIX = bytes([0x12, 0x20])  # multihash: sha2-256, 32-byte digest
+EMPTY_DIGEST = bytes(32)
+
+
+def b58encode(data):
+    number = int.from_bytes(data, 'big')
+    encoded = ''
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    leading_zeros = len(data) - len(data.lstrip(b'\0'))
+    return BASE58_ALPHABET[0] * leading_zeros + encoded
+
+
+def b58decode(text):
+    number = 0
+    for char in text:
+        index = BASE58_ALPHABET.find(char)
+        if index < 0:
+            raise ValueError(f"Invalid base58 character: {char!r}")
+        number = number * 58 + index
+    body = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    leading_zeros = len(text) - len(text.lstrip(BASE58_ALPHABET[0]))
+    return b'\0' * leading_zeros + body
+
+
+# Function to convert a CIDv0 to the bytes32 digest stored by the contract ('' maps to zero)
+def cid_to_bytes32(cid):
+    if not cid:
+        return EMPTY_DIGEST
+    multihash = b58decode(cid)
+    if len(multihash) != 34 or multihash[:2] != SHA2_256_PREFIX:
+        raise ValueError(f"Only CIDv0 (sha2-256) hashes can be stored on-chain: {cid}")
+    return multihash[2:]
+
+
+# Function to convert a bytes32 digest from the contract back to a CIDv0 ('' for zero)
+def bytes32_to_cid(digest):
+    digest = bytes(digest)
+    if digest == EMPTY_DIGEST:
+        return ''
+    return b58encode(SHA2_256_PREFIX + digest)
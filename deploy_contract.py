@@ -1,34 +1,63 @@
 # deploy_contract.py
+import argparse
+import hashlib
 import json
+import os
 from web3 import Web3
-from solcx import compile_standard, install_solc, set_solc_version, get_installed_solc_versions
 
-# Install and set the specific version of Solidity compiler
-install_solc('0.8.0')
-set_solc_version('0.8.0')
+SOLC_VERSION = '0.8.0'
+COMPILER_SETTINGS = {
+    "outputSelection": {
+        "*": {
+            "*": ["abi", "metadata", "evm.bytecode", "evm.sourceMap"]
+        }
+    }
+}
+BUILD_DIR = 'build'  # compiled artifacts keyed by source/compiler/settings hash
+COMPILED_FILE = 'compiled_code.json'
+ABI_FILE = 'abi.json'  # ABI of the current deployment, written together with the manifest
+MANIFEST_FILE = 'deployment.json'  # address, chain ID, block and ABI hash of the current deployment
+
 # Solidity source code
 contract_source_code = '''
 pragma solidity ^0.8.0;
 
 contract ClinicalTrials {
+    enum TrialStatus { Active, Completed, Suspended }
+
+    // Storage layout: the CID digest takes one slot, researcher/status/timestamps share a second
     struct Trial {
+        bytes32 dataHash;
+        address researcher;
+        TrialStatus status;
+        uint40 startDate;
+        uint40 lastUpdated;
+        string patientId;
+    }
+
+    // Shape returned by the view functions
+    struct TrialView {
         uint256 id;
         string patientId;
-        string dataHash;
+        bytes32 dataHash;
         TrialStatus status;
         address researcher;
         uint256 startDate;
         uint256 lastUpdated;
     }
 
-    enum TrialStatus { Active, Completed, Suspended }
-
+    address public owner;
+    bool public migrationOpen = false;
     uint256 public trialCount = 0;
-    mapping(uint256 => Trial) public trials;
+    mapping(uint256 => Trial) internal trials;
     mapping(address => bool) public authorizedResearchers;
+    uint256 public anchorCount = 0;
+    mapping(uint256 => bytes32) public anchorRoots;
 
-    event TrialCreated(uint256 id, string patientId, string dataHash, TrialStatus status, address researcher);
-    event TrialUpdated(uint256 id, string newDataHash, TrialStatus newStatus);
+    event TrialCreated(uint256 id, string patientId, bytes32 dataHash, TrialStatus status, address researcher);
+    event TrialUpdated(uint256 id, bytes32 newDataHash, TrialStatus newStatus);
+    event TrialMigrated(uint256 id, string patientId, bytes32 dataHash, TrialStatus status, address researcher, uint256 startDate, uint256 lastUpdated);
+    event RootAnchored(uint256 batchId, bytes32 root, uint256 leafCount);
     event ResearcherAuthorized(address researcher);
     event ResearcherDeauthorized(address researcher);
 
@@ -37,7 +66,13 @@ contract ClinicalTrials {
         _;
     }
 
+    modifier onlyOwner() {
+        require(msg.sender == owner, "Not the contract owner");
+        _;
+    }
+
     constructor() {
+        owner = msg.sender;
         authorizedResearchers[msg.sender] = true;
         emit ResearcherAuthorized(msg.sender);
     }
@@ -52,81 +87,246 @@ contract ClinicalTrials {
         emit ResearcherDeauthorized(_researcher);
     }
 
-    function createTrial(string memory _patientId, string memory _dataHash) public onlyAuthorizedResearcher {
+    function createTrial(string memory _patientId, bytes32 _dataHash) public onlyAuthorizedResearcher {
+        _createTrial(_patientId, _dataHash);
+    }
+
+    function createTrials(string[] memory _patientIds, bytes32[] memory _dataHashes) public onlyAuthorizedResearcher {
+        require(_patientIds.length == _dataHashes.length, "Array length mismatch");
+        for (uint256 i = 0; i < _patientIds.length; i++) {
+            _createTrial(_patientIds[i], _dataHashes[i]);
+        }
+    }
+
+    function _createTrial(string memory _patientId, bytes32 _dataHash) internal {
+        // Migrated trials keep their IDs, so nothing new may take an ID while a migration is running
+        require(!migrationOpen, "Migration in progress");
         trialCount++;
         trials[trialCount] = Trial(
-            trialCount,
-            _patientId,
             _dataHash,
-            TrialStatus.Active,
             msg.sender,
-            block.timestamp,
-            block.timestamp
+            TrialStatus.Active,
+            uint40(block.timestamp),
+            uint40(block.timestamp),
+            _patientId
         );
         emit TrialCreated(trialCount, _patientId, _dataHash, TrialStatus.Active, msg.sender);
     }
 
-    function updateTrial(uint256 _id, string memory _newDataHash, TrialStatus _newStatus) public onlyAuthorizedResearcher {
+    function updateTrial(uint256 _id, bytes32 _newDataHash, TrialStatus _newStatus) public onlyAuthorizedResearcher {
         require(_id > 0 && _id <= trialCount, "Invalid trial ID");
         Trial storage trial = trials[_id];
         trial.dataHash = _newDataHash;
         trial.status = _newStatus;
-        trial.lastUpdated = block.timestamp;
+        trial.lastUpdated = uint40(block.timestamp);
         emit TrialUpdated(_id, _newDataHash, _newStatus);
     }
 
-    function getTrial(uint256 _id) public view returns (Trial memory) {
+    // Copies trials from a previous deployment, preserving IDs, researchers and timestamps
+    function migrateTrials(TrialView[] memory _trials) public onlyOwner {
+        require(migrationOpen, "Migration is closed");
+        for (uint256 i = 0; i < _trials.length; i++) {
+            TrialView memory source = _trials[i];
+            require(source.id == trialCount + 1, "Trials must be migrated in ID order");
+            trialCount++;
+            trials[trialCount] = Trial(
+                source.dataHash,
+                source.researcher,
+                source.status,
+                uint40(source.startDate),
+                uint40(source.lastUpdated),
+                source.patientId
+            );
+            emit TrialMigrated(trialCount, source.patientId, source.dataHash, source.status, source.researcher, source.startDate, source.lastUpdated);
+        }
+    }
+
+    // Migration can only start on an empty contract, so trialCount always equals the number migrated
+    function openMigration() public onlyOwner {
+        require(trialCount == 0, "Contract already has trials");
+        migrationOpen = true;
+    }
+
+    function closeMigration() public onlyOwner {
+        migrationOpen = false;
+    }
+
+    // Commits the Merkle root of a batch of off-chain records in a single transaction
+    function anchorRoot(bytes32 _root, uint256 _leafCount) public onlyAuthorizedResearcher {
+        anchorCount++;
+        anchorRoots[anchorCount] = _root;
+        emit RootAnchored(anchorCount, _root, _leafCount);
+    }
+
+    // Checks a leaf against an anchored root; proof nodes are combined in sorted order
+    function verifyAnchored(uint256 _batchId, bytes32 _leaf, bytes32[] memory _proof) public view returns (bool) {
+        if (_batchId == 0 || _batchId > anchorCount) {
+            return false;
+        }
+        bytes32 node = _leaf;
+        for (uint256 i = 0; i < _proof.length; i++) {
+            bytes32 sibling = _proof[i];
+            node = node <= sibling ? keccak256(abi.encodePacked(node, sibling)) : keccak256(abi.encodePacked(sibling, node));
+        }
+        return node == anchorRoots[_batchId];
+    }
+
+    function getTrial(uint256 _id) public view returns (TrialView memory) {
         require(_id > 0 && _id <= trialCount, "Invalid trial ID");
-        return trials[_id];
+        return _view(_id);
     }
-}
-'''
 
-# Compile the contract
-compiled_sol = compile_standard({
-    "language": "Solidity",
-    "sources": {
-        "ClinicalTrials.sol": {
-            "content": contract_source_code
+    // Returns up to _count trials starting at ID _start (inclusive)
+    function getTrials(uint256 _start, uint256 _count) public view returns (TrialView[] memory) {
+        require(_start > 0, "Invalid trial ID");
+        if (_count == 0 || _start > trialCount) {
+            return new TrialView[](0);
+        }
+        uint256 end = trialCount;
+        if (_count <= trialCount - _start) {
+            end = _start + _count - 1;
         }
-    },
-    "settings": {
-        "outputSelection": {
-            "*": {
-                "*": ["abi", "metadata", "evm.bytecode", "evm.sourceMap"]
-            }
+        TrialView[] memory page = new TrialView[](end - _start + 1);
+        for (uint256 id = _start; id <= end; id++) {
+            page[id - _start] = _view(id);
         }
+        return page;
     }
-})
 
-# Save compiled contract into a json file
-with open("compiled_code.json", "w") as file:
-    json.dump(compiled_sol, file)
+    function _view(uint256 _id) internal view returns (TrialView memory) {
+        Trial storage trial = trials[_id];
+        return TrialView(_id, trial.patientId, trial.dataHash, trial.status, trial.researcher, trial.startDate, trial.lastUpdated);
+    }
+}
+'''
+
+
+def _write_if_changed(path, content):
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            if file.read() == content:
+                return False
+    with open(path, 'w') as file:
+        file.write(content)
+    return True
+
 
-# Connect to Ganache
-ganache_url = "http://127.0.0.1:8545"
-web3 = Web3(Web3.HTTPProvider(ganache_url))
+def abi_hash(abi):
+    return hashlib.sha256(json.dumps(abi, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
 
-# Check connection and account list
-if not web3.is_connected():
-    raise Exception("Failed to connect to Ganache. Check if it's running.")
 
-# Set default account
-accounts = web3.eth._accounts()
-if not accounts:
-    raise Exception("No accounts found. Make sure Ganache is running and providing accounts.")
+# Hash of everything that affects the compiler output
+def artifact_key():
+    inputs = {'source': contract_source_code, 'solc': SOLC_VERSION, 'settings': COMPILER_SETTINGS}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Install the Solidity compiler only if this version is not already present
+def ensure_solc():
+    from solcx import install_solc, set_solc_version, get_installed_solc_versions
+    if SOLC_VERSION not in [str(version) for version in get_installed_solc_versions()]:
+        install_solc(SOLC_VERSION)
+    set_solc_version(SOLC_VERSION)
+
+
+# Compile the contract, reusing the cached artifact when source, compiler and settings are unchanged
+def compile_contract():
+    key = artifact_key()
+    artifact_path = os.path.join(BUILD_DIR, f'ClinicalTrials-{key[:16]}.json')
+    if os.path.exists(artifact_path):
+        with open(artifact_path, 'r') as file:
+            compiled_sol = json.load(file)
+    else:
+        from solcx import compile_standard
+        ensure_solc()
+        compiled_sol = compile_standard({
+            "language": "Solidity",
+            "sources": {
+                "ClinicalTrials.sol": {
+                    "content": contract_source_code
+                }
+            },
+            "settings": COMPILER_SETTINGS
+        })
+        os.makedirs(BUILD_DIR, exist_ok=True)
+        with open(artifact_path, 'w') as file:
+            json.dump(compiled_sol, file)
+
+    # Save compiled contract, leaving the file untouched when nothing changed;
+    # the ABI file is only written by deploy() once the contract is on-chain
+    _write_if_changed(COMPILED_FILE, json.dumps(compiled_sol))
+    return compiled_sol
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    with open(MANIFEST_FILE, 'r') as file:
+        return json.load(file)
+
+
+# Deploy the contract unless the manifest already points at this exact build on this chain
+def deploy(web3, compiled_sol, force=False):
+    contract_output = compiled_sol['contracts']['ClinicalTrials.sol']['ClinicalTrials']
+    bytecode = contract_output['evm']['bytecode']['object']
+    abi = contract_output['abi']
+    chain_id = web3.eth.chain_id
+    key = artifact_key()
+
+    manifest = load_manifest()
+    if (not force and manifest and manifest['chain_id'] == chain_id and manifest['artifact_key'] == key
+            and web3.eth.get_code(manifest['address'])):
+        _write_if_changed(manifest['abi_file'], json.dumps(abi))
+        return manifest['address'], False
+
+    # Set default account
+    accounts = web3.eth.accounts
+    if not accounts:
+        raise Exception("No accounts found. Make sure Ganache is running and providing accounts.")
+
+    ClinicalTrials = web3.eth.contract(abi=abi, bytecode=bytecode)
+    tx_hash = ClinicalTrials.constructor().transact({'from': accounts[0]})
+    tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    if tx_receipt.status != 1:
+        raise Exception(f"Contract deployment transaction {Web3.to_hex(tx_hash)} reverted")
+
+    # The ABI and manifest describe a live deployment, so both are written only now; the manifest goes
+    # last, and readers ignore the ABI file without it
+    contract_address = tx_receipt.contractAddress
+    manifest = {
+        'address': contract_address,
+        'chain_id': chain_id,
+        'block_number': tx_receipt.blockNumber,
+        'abi_hash': abi_hash(abi),
+        'abi_file': ABI_FILE,
+        'artifact_key': key,
+    }
+    _write_if_changed(ABI_FILE, json.dumps(abi))
+    with open(MANIFEST_FILE, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return contract_address, True
+
 
-web3.eth.defaultAccount = accounts[0]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile and deploy the ClinicalTrials contract.")
+    parser.add_argument('--force', action='store_true', help="Deploy even if the manifest matches this build")
+    parser.add_argument('--compile-only', action='store_true', help=f"Only rebuild {COMPILED_FILE}; no node is needed")
+    args = parser.parse_args()
 
-# Get bytecode and ABI
-bytecode = compiled_sol['contracts']['ClinicalTrials.sol']['ClinicalTrials']['evm']['bytecode']['object']
-abi = json.loads(compiled_sol['contracts']['ClinicalTrials.sol']['ClinicalTrials']['metadata'])['output']['abi']
+    compiled_sol = compile_contract()
+    if args.compile_only:
+        print(f'Compiled contract written to {COMPILED_FILE}')
+    else:
+        # Connect to Ganache
+        ganache_url = "http://127.0.0.1:8545"
+        web3 = Web3(Web3.HTTPProvider(ganache_url))
 
-# Deploy contract
-ClinicalTrials = web3.eth.contract(abi=abi, bytecode=bytecode)
-tx_hash = ClinicalTrials.constructor().transact({'from': web3.eth.defaultAccount})
-tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        # Check connection and account list
+        if not web3.is_connected():
+            raise Exception("Failed to connect to Ganache. Check if it's running.")
 
-# Contract address
-contract_address = tx_receipt.contractAddress
-print(f'Contract deployed at address: {contract_address}')
+        contract_address, deployed = deploy(web3, compiled_sol, force=args.force)
+        if deployed:
+            print(f'Contract deployed at address: {contract_address}')
+        else:
+            print(f'Contract unchanged, already deployed at address: {contract_address}')
@@ -0,0 +1,136 @@
+# export.py
+import gzip
+import json
+from datetime import datetime
+import pandas as pd
+from ipfs import client as default_client
+from metrics import span
+
+EXPORT_CHUNK_SIZE = 200  # trials fetched and written per step
+STATUS_NAMES = ['Active', 'Completed', 'Suspended']
+
+# Unified schema covering every disease-specific record layout; anything else lands in "Extra Fields"
+RECORD_COLUMNS = [
+    "Trial Name", "Disease", "Patient ID", "Patient Name", "Date of Birth", "Age", "Gender",
+    "Condition", "Treatment Group", "Medication", "Dosage", "Start Date", "Expected End Date",
+    "Blood Sugar Level", "Blood Pressure", "Cancer Stage", "Cholesterol Level", "Additional Notes",
+]
+CHAIN_COLUMNS = ["Trial ID", "Status", "Researcher", "Last Updated"]
+EXTRA_COLUMN = "Extra Fields"
+EXPORT_COLUMNS = RECORD_COLUMNS + CHAIN_COLUMNS + [EXTRA_COLUMN]
+
+NUMERIC_COLUMNS = {"Age": "Int64", "Blood Sugar Level": "Float64", "Cholesterol Level": "Float64", "Trial ID": "Int64"}
+DATETIME_COLUMNS = ["Start Date", "Last Updated"]
+
+EXPORT_FORMATS = {
+    'csv': ('all_trials.csv', 'text/csv'),
+    'csv.gz': ('all_trials.csv.gz', 'application/gzip'),
+    'parquet': ('all_trials.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+# Reshape one trial record onto the unified export schema with stable dtypes
+def conform(df):
+    extra = [column for column in df.columns if column not in EXPORT_COLUMNS]
+    if extra:
+        extras = df[extra].astype(object).where(df[extra].notna(), None)
+        df = df.drop(columns=extra)
+        df[EXTRA_COLUMN] = [json.dumps(row, default=str) for row in extras.to_dict('records')]
+    df = df.reindex(columns=EXPORT_COLUMNS)
+    for column in EXPORT_COLUMNS:
+        if column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(NUMERIC_COLUMNS[column])
+        elif column in DATETIME_COLUMNS:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        else:
+            df[column] = df[column].astype('string')
+    return df
+
+
+# Records are stored before the contract assigns their trial ID, so the ID is added to the name on export
+def trial_name(trial_id, name):
+    if pd.isna(name) or str(name).startswith("Trial ID "):
+        return name
+    return f"Trial ID {trial_id} - {name}"
+
+
+# Yield conformed frames chunk by chunk so at most chunk_size records are held at once
+def iter_trial_frames(trials, chunk_size=EXPORT_CHUNK_SIZE, client=None, on_error=None):
+    client = client or default_client
+    trials = iter(trials)
+    while True:
+        chunk = []
+        for trial in trials:
+            chunk.append(trial)
+            if len(chunk) == chunk_size:
+                break
+        if not chunk:
+            return
+        with span('export.fetch', trials=len(chunk)):
+            results = client.get_many(trial[2] for trial in chunk)
+        frames = []
+        with span('export.conform', trials=len(chunk)):
+            for trial, (_, df, error) in zip(chunk, results):
+                if error is not None:
+                    if on_error:
+                        on_error(trial, error)
+                    continue
+                df["Trial ID"] = trial[0]
+                if "Trial Name" in df.columns:
+                    df["Trial Name"] = df["Trial Name"].map(lambda name: trial_name(trial[0], name))
+                df["Status"] = STATUS_NAMES[trial[3]]
+                df["Researcher"] = trial[4]
+                df["Start Date"] = datetime.fromtimestamp(trial[5])
+                df["Last Updated"] = datetime.fromtimestamp(trial[6])
+                frames.append(conform(df))
+            frame = pd.concat(frames, ignore_index=True) if frames else None
+        if frame is not None:
+            yield frame
+
+
+def _write_csv(frames, file):
+    rows = 0
+    pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(file, index=False)
+    for df in frames:
+        with span('export.write', rows=len(df)):
+            df.to_csv(file, index=False, header=False)
+        rows += len(df)
+    return rows
+
+
+def _write_parquet(frames, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception("Parquet export requires pyarrow (pip install pyarrow)")
+    writer = None
+    rows = 0
+    try:
+        for df in frames:
+            with span('export.write', rows=len(df)):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    schema = table.schema
+                    writer = pq.ParquetWriter(path, schema, compression='zstd')
+                writer.write_table(table.cast(schema))
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+# Stream trials into path in the requested format; returns the number of rows written
+def write_export(trials, path, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE, client=None, on_error=None):
+    frames = iter_trial_frames(trials, chunk_size=chunk_size, client=client, on_error=on_error)
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            return _write_csv(frames, file)
+    elif fmt == 'csv.gz':
+        with gzip.open(path, 'wt', newline='', encoding='utf-8') as file:
+            return _write_csv(frames, file)
+    elif fmt == 'parquet':
+        return _write_parquet(frames, path)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
@@ -0,0 +1,277 @@
+# indexer.py
+import sqlite3
+import threading
+from web3 import Web3
+from web3.exceptions import BlockNotFound
+from interact_with_contract import web3, abi, contract_address, deployment_block, _abi_type, from_contract_hash
+
+DEFAULT_DB_PATH = 'trials_index.db'
+LOG_CHUNK_SIZE = 2000  # blocks per eth_getLogs request
+REORG_WINDOW = 12  # blocks re-indexed when the chain tip we saw was reorganised away
+INDEXED_EVENTS = ('TrialCreated', 'TrialUpdated', 'TrialMigrated')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    trial_id INTEGER NOT NULL,
+    patient_id TEXT,
+    data_hash TEXT,
+    status INTEGER,
+    researcher TEXT,
+    timestamp INTEGER,
+    start_date INTEGER,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS events_trial_id ON events (trial_id);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT,
+    data_hash TEXT,
+    status INTEGER,
+    researcher TEXT,
+    start_date INTEGER,
+    last_updated INTEGER
+);
+CREATE INDEX IF NOT EXISTS trials_status ON trials (status);
+CREATE INDEX IF NOT EXISTS trials_researcher ON trials (researcher);
+CREATE INDEX IF NOT EXISTS trials_patient_id ON trials (patient_id);
+'''
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return Web3.to_bytes(hexstr=value)
+    return bytes(value)
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+
+def _event_abis():
+    events = {}
+    for entry in abi:
+        if entry.get('type') == 'event' and entry['name'] in INDEXED_EVENTS:
+            signature = f"{entry['name']}({','.join(_abi_type(p) for p in entry['inputs'])})"
+            events[Web3.keccak(text=signature)] = entry
+    return events
+
+
+_events_by_topic = _event_abis()
+
+
+# Decode a raw log (hex strings or bytes, as returned by eth_getLogs or a subscription) into (event name, args)
+def decode_event_log(log):
+    topics = [_to_bytes(topic) for topic in log['topics']]
+    entry = _events_by_topic.get(topics[0]) if topics else None
+    if entry is None:
+        return None
+    indexed = [p for p in entry['inputs'] if p['indexed']]
+    unindexed = [p for p in entry['inputs'] if not p['indexed']]
+    args = {}
+    for param, topic in zip(indexed, topics[1:]):
+        args[param['name']] = web3.codec.decode([_abi_type(param)], topic)[0]
+    values = web3.codec.decode([_abi_type(p) for p in unindexed], _to_bytes(log['data']))
+    args.update((param['name'], value) for param, value in zip(unindexed, values))
+    return entry['name'], args
+
+
+class TrialIndexer:
+    # Local SQLite index of TrialCreated/TrialUpdated events, synced incrementally from the chain
+    # Indexing starts at the deployment block from the manifest unless start_block is given
+    def __init__(self, db_path=DEFAULT_DB_PATH, start_block=None):
+        if start_block is None:
+            start_block = deployment_block
+        self.start_block = start_block
+        self.rollbacks = 0  # bumped on every reorg rollback so watchers can rebuild their views
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self._block_timestamps = {}
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            if 'start_date' not in [column[1] for column in self.conn.execute('PRAGMA table_info(events)')]:
+                self.conn.execute('ALTER TABLE events ADD COLUMN start_date INTEGER')
+            if self._get_meta('contract_address') != contract_address:
+                # Index belongs to a different deployment: start over
+                for table in ('blocks', 'events', 'trials'):
+                    self.conn.execute(f'DELETE FROM {table}')
+                self._set_meta('contract_address', contract_address)
+                self._set_meta('last_block', start_block - 1)
+
+    def _get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    @property
+    def last_block(self):
+        return int(self._get_meta('last_block'))
+
+    def _block_timestamp(self, block_number):
+        if block_number not in self._block_timestamps:
+            self._block_timestamps[block_number] = web3.eth.get_block(block_number)['timestamp']
+        return self._block_timestamps[block_number]
+
+    # Bring the index up to the current chain head; returns the number of new events
+    def sync(self):
+        with self.lock:
+            self._handle_reorg()
+            head = web3.eth.block_number
+            new_events = 0
+            start = self.last_block + 1
+            while start <= head:
+                end = min(start + LOG_CHUNK_SIZE - 1, head)
+                logs = web3.eth.get_logs({
+                    'address': contract_address,
+                    'fromBlock': start,
+                    'toBlock': end,
+                    'topics': [[Web3.to_hex(topic) for topic in _events_by_topic]],
+                })
+                new_events += self.ingest_logs(logs, end)
+                start = end + 1
+            self._block_timestamps.clear()
+            return new_events
+
+    # Apply a batch of raw logs and advance the sync cursor to through_block
+    def ingest_logs(self, logs, through_block):
+        with self.lock, self.conn:
+            count = 0
+            for log in sorted(logs, key=lambda log: (_to_int(log['blockNumber']), _to_int(log['logIndex']))):
+                if log.get('removed'):
+                    continue
+                decoded = decode_event_log(log)
+                if decoded is None:
+                    continue
+                block_number = _to_int(log['blockNumber'])
+                if block_number <= self.last_block:
+                    continue
+                name, args = decoded
+                row = self._event_row(name, args, block_number, _to_int(log['logIndex']))
+                self.conn.execute('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+                self._apply(row)
+                count += 1
+            if through_block > self.last_block:
+                block_hash = Web3.to_hex(web3.eth.get_block(through_block)['hash'])
+                self.conn.execute('INSERT OR REPLACE INTO blocks VALUES (?, ?)', (through_block, block_hash))
+                self.conn.execute('DELETE FROM blocks WHERE number < ?', (through_block - REORG_WINDOW,))
+                self._set_meta('last_block', through_block)
+            return count
+
+    def _event_row(self, name, args, block_number, log_index):
+        timestamp = self._block_timestamp(block_number)
+        if name == 'TrialCreated':
+            return (block_number, log_index, name, args['id'], args['patientId'], from_contract_hash(args['dataHash']),
+                    args['status'], Web3.to_checksum_address(args['researcher']), timestamp, timestamp)
+        elif name == 'TrialMigrated':
+            # Migrated trials keep the dates they had on the previous deployment
+            return (block_number, log_index, name, args['id'], args['patientId'], from_contract_hash(args['dataHash']),
+                    args['status'], Web3.to_checksum_address(args['researcher']), args['lastUpdated'], args['startDate'])
+        return (block_number, log_index, name, args['id'], None, from_contract_hash(args['newDataHash']),
+                args['newStatus'], None, timestamp, None)
+
+    def _apply(self, row):
+        _, _, name, trial_id, patient_id, data_hash, status, researcher, timestamp, start_date = row
+        if name in ('TrialCreated', 'TrialMigrated'):
+            self.conn.execute(
+                'INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (trial_id, patient_id, data_hash, status, researcher, start_date, timestamp),
+            )
+        else:
+            self.conn.execute(
+                'UPDATE trials SET data_hash = ?, status = ?, last_updated = ? WHERE id = ?',
+                (data_hash, status, timestamp, trial_id),
+            )
+
+    # Roll back the confirmation window if the last block we indexed is no longer canonical,
+    # or the whole index if the node now serves a different chain (e.g. a restarted Ganache)
+    def _handle_reorg(self):
+        if self._get_meta('genesis_hash') is None:
+            with self.conn:
+                self._set_meta('genesis_hash', self._genesis_hash())
+        last_block = self.last_block
+        row = self.conn.execute('SELECT hash FROM blocks WHERE number = ?', (last_block,)).fetchone()
+        if row is None:
+            return
+        try:
+            if Web3.to_hex(web3.eth.get_block(last_block)['hash']) == row[0]:
+                return
+        except BlockNotFound:
+            pass  # The chain is now shorter than the index
+        genesis_hash = self._genesis_hash()
+        if genesis_hash != self._get_meta('genesis_hash'):
+            with self.conn:
+                self._set_meta('genesis_hash', genesis_hash)
+            self.rollback(self.start_block - 1)
+        else:
+            self.rollback(max(self.start_block - 1, min(last_block - REORG_WINDOW, web3.eth.block_number)))
+
+    def _genesis_hash(self):
+        return Web3.to_hex(web3.eth.get_block(0)['hash'])
+
+    # Drop everything indexed after block_number and rebuild the affected trials from remaining events
+    def rollback(self, block_number):
+        with self.lock, self.conn:
+            affected = [r[0] for r in self.conn.execute(
+                'SELECT DISTINCT trial_id FROM events WHERE block_number > ?', (block_number,))]
+            self.conn.execute('DELETE FROM events WHERE block_number > ?', (block_number,))
+            self.conn.execute('DELETE FROM blocks WHERE number > ?', (block_number,))
+            for trial_id in affected:
+                self.conn.execute('DELETE FROM trials WHERE id = ?', (trial_id,))
+                for row in self.conn.execute(
+                        'SELECT * FROM events WHERE trial_id = ? ORDER BY block_number, log_index', (trial_id,)).fetchall():
+                    self._apply(row)
+            self._set_meta('last_block', block_number)
+            self.rollbacks += 1
+
+    @staticmethod
+    def _filters(status=None, researcher=None, patient_id=None):
+        clauses, params = [], []
+        if status is not None:
+            statuses = [status] if isinstance(status, int) else list(status)
+            clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if researcher:
+            clauses.append('researcher = ?')
+            params.append(Web3.to_checksum_address(researcher))
+        if patient_id:
+            clauses.append('patient_id = ?')
+            params.append(patient_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return where, params
+
+    # List indexed trials in the same tuple shape as get_trial(), optionally filtered
+    def list_trials(self, status=None, researcher=None, patient_id=None, limit=None, offset=0):
+        where, params = self._filters(status, researcher, patient_id)
+        query = f'SELECT id, patient_id, data_hash, status, researcher, start_date, last_updated FROM trials{where} ORDER BY id'
+        if limit is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params += [limit, offset]
+        with self.lock:
+            return [tuple(row) for row in self.conn.execute(query, params)]
+
+    def count_trials(self, status=None, researcher=None, patient_id=None):
+        where, params = self._filters(status, researcher, patient_id)
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM trials{where}', params).fetchone()[0]
+
+    def get_trial(self, trial_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT id, patient_id, data_hash, status, researcher, start_date, last_updated FROM trials WHERE id = ?',
+                (trial_id,)).fetchone()
+        return tuple(row) if row else None
+
+    # Full event history for one trial, oldest first
+    def trial_events(self, trial_id):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT block_number, event, data_hash, status, timestamp FROM events WHERE trial_id = ? ORDER BY block_number, log_index',
+                (trial_id,)).fetchall()
@@ -0,0 +1,105 @@
+# ingest.py
+import pandas as pd
+from ipfs import CSV, PARQUET, ARROW, _require_pyarrow
+
+INGEST_CHUNK_ROWS = 50000  # rows parsed per chunk
+SAMPLE_ROWS = 10000  # rows used to infer the schema
+PREVIEW_ROWS = 200  # rows shown in the UI
+
+
+# Infer a column -> dtype mapping from a sample that later chunks can be read with consistently
+def infer_schema(sample):
+    schema = {}
+    for column, dtype in sample.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            schema[column] = 'boolean'
+        elif pd.api.types.is_integer_dtype(dtype):
+            # Nullable so a later chunk with a blank cell does not change the type
+            schema[column] = 'Int64'
+        elif pd.api.types.is_float_dtype(dtype):
+            schema[column] = 'Float64'
+        else:
+            schema[column] = 'string'
+    return schema
+
+
+# Read the file in chunks, returning its schema, a bounded preview and the row count
+def scan_csv(file, chunk_rows=INGEST_CHUNK_ROWS, sample_rows=SAMPLE_ROWS, preview_rows=PREVIEW_ROWS):
+    file.seek(0)
+    sample = pd.read_csv(file, nrows=sample_rows)
+    schema = infer_schema(sample)
+    preview = sample.head(preview_rows)
+    del sample
+
+    file.seek(0)
+    row_count = 0
+    for chunk in pd.read_csv(file, chunksize=chunk_rows, usecols=[0]):
+        row_count += len(chunk)
+    file.seek(0)
+    return {'schema': schema, 'preview': preview, 'row_count': row_count, 'columns': list(schema)}
+
+
+BOOLEAN_TOKENS = {'true': True, 'false': False}
+
+
+# Cast a chunk read as text onto the schema; values that no longer fit (a stray token after the
+# sample the schema was inferred from) become missing and are counted in coerced instead of failing
+def conform_chunk(chunk, schema, coerced=None):
+    for column, dtype in schema.items():
+        raw = chunk[column]
+        if dtype in ('Int64', 'Float64'):
+            values = pd.to_numeric(raw, errors='coerce')
+            if dtype == 'Int64':
+                values = values.where(values % 1 == 0)
+        elif dtype == 'boolean':
+            values = raw.str.strip().str.lower().map(BOOLEAN_TOKENS)
+        else:
+            values = raw
+        lost = values.isna() & raw.notna()
+        if coerced is not None and lost.any():
+            coerced[column] = coerced.get(column, 0) + int(lost.sum())
+        chunk[column] = values.astype(dtype)
+    return chunk
+
+
+def iter_chunks(file, schema, chunk_rows=INGEST_CHUNK_ROWS, coerced=None):
+    file.seek(0)
+    for chunk in pd.read_csv(file, chunksize=chunk_rows, dtype=str):
+        yield conform_chunk(chunk, schema, coerced)
+
+
+# Convert a CSV to Parquet or Arrow IPC chunk by chunk, writing to path
+def convert_csv(file, path, fmt, schema, chunk_rows=INGEST_CHUNK_ROWS, coerced=None):
+    pa = _require_pyarrow()
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+    writer = None
+    arrow_schema = None
+    try:
+        for chunk in iter_chunks(file, schema, chunk_rows, coerced):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                arrow_schema = table.schema
+                if fmt == PARQUET:
+                    writer = pq.ParquetWriter(path, arrow_schema, compression='zstd')
+                elif fmt == ARROW:
+                    writer = pa.ipc.new_file(path, arrow_schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+                else:
+                    raise ValueError(f"Unsupported payload format: {fmt}")
+            writer.write_table(table.cast(arrow_schema))
+    finally:
+        if writer is not None:
+            writer.close()
+        file.seek(0)
+
+
+# Stream a CSV to IPFS, converting it first if a columnar format is requested; returns the hash.
+# Per-column counts of values that did not fit the inferred schema are added to coerced.
+def upload_csv(client, file, fmt=CSV, schema=None, tmp_path=None, chunk_rows=INGEST_CHUNK_ROWS, coerced=None):
+    file.seek(0)
+    if fmt == CSV:
+        # Already CSV: send the original bytes without parsing them
+        return client.add_stream(file, 'data.csv')
+    convert_csv(file, tmp_path, fmt, schema, chunk_rows, coerced)
+    with open(tmp_path, 'rb') as converted:
+        return client.add_stream(converted, f'data.{"parquet" if fmt == PARQUET else "arrow"}')
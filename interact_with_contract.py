@@ -1,20 +1,85 @@
 from web3 import Web3
+from web3.logs import DISCARD
+import contextvars
 import json
+import os
+import requests
+from tx_manager import TransactionManager
+from metrics import registry, timed
+from cid import cid_to_bytes32, bytes32_to_cid
+from deploy_contract import ABI_FILE, COMPILED_FILE, MANIFEST_FILE, abi_hash
+
+_rpc_method = contextvars.ContextVar('rpc_method', default='unknown')
+
+
+# HTTP provider that records latency, errors and payload bytes of every JSON-RPC request, labelled by method
+class InstrumentedHTTPProvider(Web3.HTTPProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Single and batch requests both end in this POST, which is the only place the raw bytes are seen
+        post = self._request_session_manager.make_post_request
+
+        def instrumented_post(endpoint_uri, data, **post_kwargs):
+            method = _rpc_method.get()
+            with timed('medchain_rpc', method=method):
+                response = post(endpoint_uri, data, **post_kwargs)
+            registry.inc('medchain_rpc_bytes_total', len(data), method=method, direction='sent')
+            registry.inc('medchain_rpc_bytes_total', len(response), method=method, direction='received')
+            return response
+
+        self._request_session_manager.make_post_request = instrumented_post
+
+    def make_request(self, method, params):
+        token = _rpc_method.set(method)
+        try:
+            return super().make_request(method, params)
+        finally:
+            _rpc_method.reset(token)
+
+    def make_batch_request(self, batch_requests):
+        token = _rpc_method.set('batch:' + ','.join(sorted({method for method, _ in batch_requests})))
+        try:
+            return super().make_batch_request(batch_requests)
+        finally:
+            _rpc_method.reset(token)
 
 # Connect to Ganache (or another Ethereum node)
 ganache_url = "http://127.0.0.1:8545"
-web3 = Web3(Web3.HTTPProvider(ganache_url))
+web3 = Web3(InstrumentedHTTPProvider(ganache_url))
+
+# Used when no deployment manifest has been written yet
+DEFAULT_CONTRACT_ADDRESS = '0x497615B8bbf78A188870251a17565Fc038fAD45F'
 
-# Load contract ABI and address
-with open('compiled_code.json', 'r') as file:
-    compiled_sol = json.load(file)
+# Load contract ABI, address and deployment block at import time from the manifest written by deploy_contract.py
+def _load_deployment():
+    if not os.path.exists(MANIFEST_FILE):
+        # No deployment recorded: any ABI file is not trusted, use the committed compiler output
+        with open(COMPILED_FILE, 'r') as file:
+            abi = json.load(file)['contracts']['ClinicalTrials.sol']['ClinicalTrials']['abi']
+        return abi, DEFAULT_CONTRACT_ADDRESS, 0
+    with open(MANIFEST_FILE, 'r') as file:
+        manifest = json.load(file)
+    abi_file = manifest.get('abi_file', ABI_FILE)
+    with open(abi_file, 'r') as file:
+        abi = json.load(file)
+    if manifest['abi_hash'] != abi_hash(abi):
+        raise Exception(f"{abi_file} does not match the deployed contract; rerun deploy_contract.py")
+    return abi, manifest['address'], manifest.get('block_number', 0)
 
-abi = compiled_sol['contracts']['ClinicalTrials.sol']['ClinicalTrials']['abi']
-contract_address = '0x497615B8bbf78A188870251a17565Fc038fAD45F'  # contract address
+abi, contract_address, deployment_block = _load_deployment()
 
 # Create contract instance
 contract = web3.eth.contract(address=contract_address, abi=abi)
 
+# Number of patients registered per createTrials transaction
+CREATE_BATCH_SIZE = 100
+
+# Number of getTrial calls packed into a single JSON-RPC batch request
+TRIAL_BATCH_SIZE = 100
+
+# Nonce-managed submitter shared by every write so nonces stay ordered per account
+transaction_manager = TransactionManager(web3)
+
 # Function to get accounts
 def get_accounts():
     return web3.eth.accounts
@@ -25,26 +90,148 @@ def get_accounts():
 #     receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
 #     return receipt
 
+# Function to check whether the deployed ABI exposes a contract function
+def has_function(name):
+    return any(entry.get('type') == 'function' and entry['name'] == name for entry in abi)
+
+def _function_abi(name):
+    for entry in abi:
+        if entry.get('type') == 'function' and entry['name'] == name:
+            return entry
+    raise ValueError(f"Function {name} not found in contract ABI")
+
+# Compact deployments store CIDs as bytes32 digests; older ones store the CID string
+stores_cid_digests = _function_abi('createTrial')['inputs'][1]['type'] == 'bytes32'
+
+# Function to convert a CID to the form the deployed contract stores
+def to_contract_hash(ipfs_hash):
+    return cid_to_bytes32(ipfs_hash) if stores_cid_digests else ipfs_hash
+
+# Function to convert a stored hash (bytes32 digest or CID string) back to a CID
+def from_contract_hash(data_hash):
+    return bytes32_to_cid(data_hash) if isinstance(data_hash, (bytes, bytearray)) else data_hash
+
+# Normalise a getTrial/getTrials record to (id, patientId, CID, status, researcher, startDate, lastUpdated)
+def _normalize_trial(trial):
+    trial = list(trial)
+    trial[2] = from_contract_hash(trial[2])
+    trial[4] = Web3.to_checksum_address(trial[4])
+    return tuple(trial)
+
+# Function to submit a createTrial transaction without waiting for it to be mined
+def submit_create_trial(patient_id, ipfs_hash, account):
+    return transaction_manager.submit(
+        contract.functions.createTrial(patient_id, to_contract_hash(ipfs_hash)), account, label=f"Create trial for {patient_id}")
+
+# Function to submit an updateTrial transaction without waiting for it to be mined
+def submit_update_trial(trial_id, additional_info, status, account):
+    return transaction_manager.submit(
+        contract.functions.updateTrial(trial_id, to_contract_hash(additional_info), status), account, label=f"Update trial {trial_id}")
+
+# Function to submit batched createTrials transactions; returns the transaction hashes
+def submit_create_trials(patient_ids, ipfs_hashes, account, batch_size=CREATE_BATCH_SIZE):
+    patient_ids, ipfs_hashes = list(patient_ids), list(ipfs_hashes)
+    if len(patient_ids) != len(ipfs_hashes):
+        raise ValueError("patient_ids and ipfs_hashes must have the same length")
+    if not has_function('createTrials'):
+        # Contract deployed before createTrials existed: pipeline one createTrial per patient
+        return [submit_create_trial(patient_id, ipfs_hash, account) for patient_id, ipfs_hash in zip(patient_ids, ipfs_hashes)]
+    tx_hashes = []
+    for start in range(0, len(patient_ids), batch_size):
+        batch_ids = patient_ids[start:start + batch_size]
+        tx_hashes.append(transaction_manager.submit(
+            contract.functions.createTrials(batch_ids, [to_contract_hash(h) for h in ipfs_hashes[start:start + batch_size]]),
+            account, label=f"Create {len(batch_ids)} trials"))
+    return tx_hashes
+
+# Function to get the IDs the contract assigned to trials created in a mined transaction
+def created_trial_ids(receipt):
+    return [event['args']['id'] for event in contract.events.TrialCreated().process_receipt(receipt, errors=DISCARD)]
+
 # Function to create trial
 def create_trial(patient_id, ipfs_hash, account):
-    web3.eth.default_account = account  # Set the default account
-    tx_hash = contract.functions.createTrial(patient_id, ipfs_hash).transact({'from': account})
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    tx_hash = submit_create_trial(patient_id, ipfs_hash, account)
+    receipt = transaction_manager.wait(tx_hash)
     return receipt
 
 # Function to update trial
 def update_trial(trial_id, additional_info, status, account):
-    web3.eth.default_account = account  # Set the default account
-    tx_hash = contract.functions.updateTrial(trial_id, additional_info, status).transact({'from': account})
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    tx_hash = submit_update_trial(trial_id, additional_info, status, account)
+    receipt = transaction_manager.wait(tx_hash)
     return receipt
 
 # Function to get trial
 def get_trial(trial_id):
     trial = contract.functions.getTrial(trial_id).call()
-    return trial
+    return _normalize_trial(trial)
 
 # Function to get trial count
 def get_trial_count():
-    count = contract.functions.trialCount().call()
-    return count
+    return contract.functions.trialCount().call()
+
+# Build the canonical ABI type string (tuples expanded) for a function input/output
+def _abi_type(param):
+    if param['type'].startswith('tuple'):
+        inner = ','.join(_abi_type(component) for component in param['components'])
+        return f"({inner}){param['type'][len('tuple'):]}"
+    return param['type']
+
+_get_trial_abi = _function_abi('getTrial')
+_get_trial_selector = Web3.keccak(
+    text=f"getTrial({','.join(_abi_type(p) for p in _get_trial_abi['inputs'])})"
+)[:4]
+_get_trial_output_types = [_abi_type(p) for p in _get_trial_abi['outputs']]
+
+# Decode raw getTrial return data into the same shape as contract.functions.getTrial().call()
+def _decode_trial(data):
+    return _normalize_trial(web3.codec.decode(_get_trial_output_types, bytes(data))[0])
+
+# Send one JSON-RPC batch of getTrial eth_calls over the provider's own endpoint and session;
+# returns None when the node rejects batches
+def _batch_get_trials(trial_ids):
+    batch = []
+    for trial_id in trial_ids:
+        data = _get_trial_selector + web3.codec.encode(['uint256'], [trial_id])
+        batch.append(('eth_call', [{'to': contract_address, 'data': Web3.to_hex(data)}, 'latest']))
+    try:
+        results = web3.provider.make_batch_request(batch)
+    except (requests.RequestException, ValueError):
+        return None
+    if not isinstance(results, list) or len(results) != len(trial_ids):
+        return None
+
+    # The provider returns responses sorted back into request order
+    return [_decode_trial(Web3.to_bytes(hexstr=result['result'])) if 'result' in result else None
+            for result in results]
+
+def _check_chunk_size(chunk_size):
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+# Function to get many trials, packing getTrial calls into JSON-RPC batches of chunk_size
+def get_trials(trial_ids, chunk_size=TRIAL_BATCH_SIZE):
+    _check_chunk_size(chunk_size)
+    trial_ids = list(trial_ids)
+    trials = []
+    batching = isinstance(web3.provider, Web3.HTTPProvider) and hasattr(web3.provider, 'make_batch_request')
+    for start in range(0, len(trial_ids), chunk_size):
+        chunk = trial_ids[start:start + chunk_size]
+        batch = _batch_get_trials(chunk) if batching else None
+        if batch is None:
+            # Node rejected the batch (or is not HTTP): fall back to single calls from now on
+            batching = False
+            batch = [None] * len(chunk)
+        # Calls that failed inside the batch are retried singly so errors surface as usual
+        trials.extend(trial if trial is not None else get_trial(trial_id) for trial_id, trial in zip(chunk, batch))
+    return trials
+
+# Function to get all trials with IDs in [start, end], a page per call where getTrials is available
+def get_trial_range(start, end, chunk_size=TRIAL_BATCH_SIZE):
+    _check_chunk_size(chunk_size)
+    if not has_function('getTrials'):
+        return get_trials(range(start, end + 1), chunk_size=chunk_size)
+    trials = []
+    for page_start in range(start, end + 1, chunk_size):
+        page = contract.functions.getTrials(page_start, min(chunk_size, end + 1 - page_start)).call()
+        trials.extend(_normalize_trial(trial) for trial in page)
+    return trials
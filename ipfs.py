@@ -1,27 +1,234 @@
 # ipfs.py
 import requests
 import io
+import uuid
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from ipfs_cache import CIDCache
+from metrics import registry, timed, span, bind_context
 
-# Function to add a DataFrame as CSV to IPFS
-def add_csv_to_ipfs(df):
-    # Convert DataFrame to CSV bytes
-    csv_bytes = df.to_csv(index=False).encode('utf-8')
-    files = {'file': ('data.csv', csv_bytes)}
-    response = requests.post('http://127.0.0.1:5001/api/v0/add', files=files)
-    if response.status_code == 200:
+IPFS_API_URL = 'http://127.0.0.1:5001/api/v0'
+DEFAULT_MAX_WORKERS = 16
+STREAM_CHUNK_SIZE = 1024 * 1024  # bytes read per chunk when streaming an upload
+
+# Payload formats for DataFrames stored on IPFS; the format is detected from the bytes on read
+CSV = 'csv'
+PARQUET = 'parquet'
+ARROW = 'arrow'
+PAYLOAD_FORMATS = (CSV, PARQUET, ARROW)
+DEFAULT_PAYLOAD_FORMAT = CSV
+PAYLOAD_FILENAMES = {CSV: 'data.csv', PARQUET: 'data.parquet', ARROW: 'data.arrow'}
+PARQUET_MAGIC = b'PAR1'
+ARROW_MAGIC = b'ARROW1'
+VERSIONED_MAGIC = b'{"format":"medchain-'  # trial_history patch/snapshot documents
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise Exception("Parquet and Arrow payloads require pyarrow (pip install pyarrow)")
+
+
+# Function to serialize a DataFrame in the given payload format
+def encode_frame(df, fmt=DEFAULT_PAYLOAD_FORMAT):
+    if fmt == CSV:
+        return df.to_csv(index=False).encode('utf-8')
+    elif fmt == PARQUET:
+        _require_pyarrow()
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False, compression='zstd')
+        return buffer.getvalue()
+    elif fmt == ARROW:
+        pa = _require_pyarrow()
+        import pyarrow.ipc
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    else:
+        raise ValueError(f"Unsupported payload format: {fmt}")
+
+
+# Function to detect the payload format from its leading bytes; anything else is treated as CSV
+def detect_format(data):
+    if data[:4] == PARQUET_MAGIC and data[-4:] == PARQUET_MAGIC:
+        return PARQUET
+    if data[:6] == ARROW_MAGIC:
+        return ARROW
+    return CSV
+
+
+# Function to check whether a payload is a versioned trial record (see trial_history)
+def is_versioned_payload(data):
+    return data[:len(VERSIONED_MAGIC)] == VERSIONED_MAGIC
+
+
+# Function to parse a payload of any supported format into a DataFrame
+def decode_frame(data):
+    fmt = detect_format(data)
+    with timed('medchain_ipfs_decode', format=fmt):
+        if fmt == PARQUET:
+            _require_pyarrow()
+            return pd.read_parquet(io.BytesIO(data))
+        elif fmt == ARROW:
+            pa = _require_pyarrow()
+            import pyarrow.ipc
+            return pa.ipc.open_file(pa.BufferReader(data)).read_all().to_pandas()
+        return pd.read_csv(io.StringIO(data.decode('utf-8')))
+
+
+class IPFSClient:
+    # IPFS HTTP API client backed by a persistent keep-alive connection pool
+    def __init__(self, api_url=IPFS_API_URL, max_workers=DEFAULT_MAX_WORKERS, cache=None, payload_format=DEFAULT_PAYLOAD_FORMAT):
+        self.api_url = api_url
+        self.max_workers = max_workers
+        self.cache = cache
+        self.payload_format = payload_format
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    # Return the daemon version string; a cheap connectivity check
+    def version(self):
+        response = self.session.post(f'{self.api_url}/version')
+        if response.status_code == 200:
+            return response.json()['Version']
+        else:
+            raise Exception(f"IPFS version error: {response.text}")
+
+    # Add raw bytes to IPFS and return the hash
+    def add_bytes(self, data, filename='data'):
+        files = {'file': (filename, data)}
+        with timed('medchain_ipfs_request', op='add'):
+            response = self.session.post(f'{self.api_url}/add', params={'cid-version': 0}, files=files)
+            if response.status_code != 200:
+                raise Exception(f"IPFS add error: {response.text}")
+        registry.inc('medchain_ipfs_bytes_total', len(data), op='add')
         ipfs_hash = response.json()['Hash']
+        if self.cache is not None:
+            # Write-through: the content for this CID can never change
+            self.cache.put_bytes(ipfs_hash, data)
         return ipfs_hash
-    else:
-        raise Exception(f"IPFS add error: {response.text}")
 
-# Function to get CSV from IPFS and return as DataFrame
-def get_csv_from_ipfs(ipfs_hash):
-    params = {'arg': ipfs_hash}
-    response = requests.post('http://127.0.0.1:5001/api/v0/cat', params=params)
-    if response.status_code == 200:
-        csv_data = response.content.decode('utf-8')
-        df = pd.read_csv(io.StringIO(csv_data))
+    # Add a file-like object to IPFS as a chunked multipart upload without buffering it in memory
+    def add_stream(self, file, filename='data', chunk_size=STREAM_CHUNK_SIZE):
+        boundary = uuid.uuid4().hex
+        sent = 0
+
+        def body():
+            nonlocal sent
+            yield (f'--{boundary}\r\n'
+                   f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                yield chunk
+            yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+        with timed('medchain_ipfs_request', op='add_stream'):
+            response = self.session.post(f'{self.api_url}/add', params={'cid-version': 0}, data=body(),
+                                         headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+            if response.status_code != 200:
+                raise Exception(f"IPFS add error: {response.text}")
+        registry.inc('medchain_ipfs_bytes_total', sent, op='add_stream')
+        return response.json()['Hash']
+
+    # Add a DataFrame to IPFS in the given (or the client's default) payload format
+    def add_frame(self, df, fmt=None):
+        fmt = fmt or self.payload_format
+        return self.add_bytes(encode_frame(df, fmt), PAYLOAD_FILENAMES[fmt])
+
+    # Add a DataFrame as CSV to IPFS and return its hash
+    def add_csv(self, df):
+        return self.add_frame(df, CSV)
+
+    # Add many DataFrames concurrently; returns (cid, error) tuples in input order
+    def add_many(self, frames, max_workers=None, fmt=None):
+        def add(df):
+            try:
+                with span('ipfs.add_frame'):
+                    return self.add_frame(df, fmt), None
+            except Exception as e:
+                return None, e
+
+        frames = list(frames)
+        if not frames:
+            return []
+        workers = min(max_workers or self.max_workers, len(frames))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(bind_context(add), frames))
+
+    # Fetch raw bytes for a CID, consulting the on-disk cache first
+    def cat(self, ipfs_hash):
+        if self.cache is not None:
+            data = self.cache.get_bytes(ipfs_hash)
+            if data is not None:
+                return data
+        with timed('medchain_ipfs_request', op='cat'):
+            response = self.session.post(f'{self.api_url}/cat', params={'arg': ipfs_hash})
+            if response.status_code != 200:
+                raise Exception(f"IPFS cat error: {response.text}")
+        registry.inc('medchain_ipfs_bytes_total', len(response.content), op='cat')
+        if self.cache is not None:
+            self.cache.put_bytes(ipfs_hash, response.content)
+        return response.content
+
+    # Fetch a payload of any supported format from IPFS and return it as a DataFrame
+    def get_frame(self, ipfs_hash):
+        if self.cache is not None:
+            df = self.cache.get_frame(ipfs_hash)
+            if df is not None:
+                return df
+        data = self.cat(ipfs_hash)
+        if is_versioned_payload(data):
+            from trial_history import load_record  # imported here: trial_history depends on this module
+            df = load_record(self, ipfs_hash)
+        else:
+            df = decode_frame(data)
+        if self.cache is not None:
+            self.cache.put_frame(ipfs_hash, df)
         return df
-    else:
-        raise Exception(f"IPFS cat error: {response.text}")
+
+    # Kept for existing callers; CSV CIDs and columnar CIDs are both readable
+    def get_csv(self, ipfs_hash):
+        return self.get_frame(ipfs_hash)
+
+    # Fetch many payloads concurrently; returns (cid, df, error) tuples in input order
+    def get_many(self, cids, max_workers=None):
+        def fetch(cid):
+            try:
+                with span('ipfs.get_frame', cid=cid):
+                    return cid, self.get_frame(cid), None
+            except Exception as e:
+                return cid, None, e
+
+        cids = list(cids)
+        if not cids:
+            return []
+        workers = min(max_workers or self.max_workers, len(cids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(bind_context(fetch), cids))
+
+
+# Shared client used by the module-level helpers
+client = IPFSClient(cache=CIDCache())
+
+# Function to add a DataFrame as CSV to IPFS
+def add_csv_to_ipfs(df):
+    return client.add_csv(df)
+
+# Function to add a DataFrame to IPFS as CSV, Parquet or Arrow IPC
+def add_frame_to_ipfs(df, fmt=DEFAULT_PAYLOAD_FORMAT):
+    return client.add_frame(df, fmt)
+
+# Function to get a payload from IPFS (CSV, Parquet or Arrow) and return as DataFrame
+def get_csv_from_ipfs(ipfs_hash):
+    return client.get_frame(ipfs_hash)
@@ -0,0 +1,150 @@
+# ipfs_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from metrics import registry
+
+# IPFS content is immutable, so entries keyed by CID never go stale and are only evicted for space
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024  # bytes of parsed DataFrames kept in process
+DEFAULT_DISK_BUDGET = 2 * 1024 * 1024 * 1024  # bytes of raw payloads kept on disk
+DEFAULT_CACHE_DIR = '.ipfs_cache'
+
+
+class FrameLRU:
+    # In-process LRU of parsed DataFrames bounded by their deep memory usage
+    def __init__(self, budget=DEFAULT_MEMORY_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cid):
+        with self._lock:
+            entry = self._entries.get(cid)
+            if entry is None:
+                return None
+            self._entries.move_to_end(cid)
+            return entry[0]
+
+    def put(self, cid, df):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.budget:
+            return
+        with self._lock:
+            if cid in self._entries:
+                self.size -= self._entries.pop(cid)[1]
+            self._entries[cid] = (df, nbytes)
+            self.size += nbytes
+            while self.size > self.budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBlobStore:
+    # On-disk store of raw payload bytes, evicting least recently used files past the size budget
+    def __init__(self, directory=DEFAULT_CACHE_DIR, budget=DEFAULT_DISK_BUDGET):
+        self.directory = directory
+        self.budget = budget
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    # CIDs come from on-chain data, so the filename is a hash of the CID rather than the CID itself
+    def _path(self, cid):
+        return os.path.join(self.directory, hashlib.sha256(cid.encode('utf-8')).hexdigest())
+
+    def get(self, cid):
+        path = self._path(cid)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def put(self, cid, data):
+        if len(data) > self.budget:
+            return
+        path = self._path(cid)
+        if os.path.exists(path):
+            return
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        with self._lock:
+            # Re-check under the lock so concurrent puts of one CID count its size once
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, path)
+            self.size += len(data)
+            if self.size > self.budget:
+                self._evict()
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith('.tmp')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.budget:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self.size -= size
+
+
+class CIDCache:
+    # Two-tier cache: parsed DataFrames in memory, raw bytes on disk
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, directory=DEFAULT_CACHE_DIR, disk_budget=DEFAULT_DISK_BUDGET):
+        self.frames = FrameLRU(memory_budget)
+        self.blobs = DiskBlobStore(directory, disk_budget)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # Return a copy so callers can add columns without mutating the cached frame
+    def get_frame(self, cid):
+        df = self.frames.get(cid)
+        if df is None:
+            registry.inc('medchain_ipfs_cache_misses_total', tier='memory')
+            return None
+        self.memory_hits += 1
+        registry.inc('medchain_ipfs_cache_hits_total', tier='memory')
+        return df.copy()
+
+    def put_frame(self, cid, df):
+        self.frames.put(cid, df.copy())
+
+    def get_bytes(self, cid):
+        data = self.blobs.get(cid)
+        if data is None:
+            self.misses += 1
+            registry.inc('medchain_ipfs_cache_misses_total', tier='disk')
+        else:
+            self.disk_hits += 1
+            registry.inc('medchain_ipfs_cache_hits_total', tier='disk')
+        return data
+
+    def put_bytes(self, cid, data):
+        self.blobs.put(cid, data)
+
+    def stats(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_entries': len(self.frames),
+            'memory_bytes': self.frames.size,
+            'disk_bytes': self.blobs.size,
+        }
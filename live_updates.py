@@ -0,0 +1,152 @@
+# live_updates.py
+# Push-based trial updates: a WebSocket subscription to new heads and TrialCreated/TrialUpdated logs
+# keeps the local index and an in-memory trial view current. Falls back to HTTP polling when the
+# WebSocket endpoint is unavailable, and backfills any gap through the indexer on reconnect.
+import asyncio
+import json
+import threading
+import time
+from web3 import Web3
+from interact_with_contract import contract_address
+from metrics import registry
+from indexer import decode_event_log, _events_by_topic
+
+WS_URL = "ws://127.0.0.1:8545"
+POLL_INTERVAL = 5  # seconds between HTTP polls while the WebSocket is down
+MAX_BACKOFF = 30  # seconds between reconnect attempts at most
+
+STOPPED = 'stopped'
+WEBSOCKET = 'websocket'
+POLLING = 'polling'
+
+
+class LiveTrialFeed:
+    # Keeps `trials` (trial ID -> get_trial()-shaped tuple) current and bumps `version` on every change
+    def __init__(self, indexer, ws_url=WS_URL, poll_interval=POLL_INTERVAL):
+        self.indexer = indexer
+        self.ws_url = ws_url
+        self.poll_interval = poll_interval
+        self.trials = {}
+        self.version = 0
+        self.head = None
+        self.mode = STOPPED
+        self.last_error = None
+        self.lock = threading.Lock()
+        self._listeners = []
+        self._dirty = set()
+        self._thread = None
+
+    # Register fn(changed_trial_ids) to be called from the feed thread after each change
+    def subscribe(self, fn):
+        self._listeners.append(fn)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), name='live-trial-feed', daemon=True)
+            self._thread.start()
+
+    def _publish(self, changed):
+        if not changed:
+            return
+        with self.lock:
+            self.version += 1
+        for fn in list(self._listeners):
+            try:
+                fn(changed)
+            except Exception:
+                pass
+
+    # Rebuild the whole view from the index (after a backfill or reorg)
+    def _reload_all(self):
+        trials = {trial[0]: trial for trial in self.indexer.list_trials()}
+        with self.lock:
+            changed = {trial_id for trial_id, trial in trials.items() if self.trials.get(trial_id) != trial}
+            changed |= set(self.trials) - set(trials)
+            self.trials = trials
+        self._publish(changed)
+
+    def _refresh(self, trial_ids):
+        changed = set()
+        for trial_id in trial_ids:
+            trial = self.indexer.get_trial(trial_id)
+            with self.lock:
+                if self.trials.get(trial_id) != trial:
+                    changed.add(trial_id)
+                    if trial is None:
+                        self.trials.pop(trial_id, None)
+                    else:
+                        self.trials[trial_id] = trial
+        self._publish(changed)
+
+    # Sync the index over HTTP: used for gap backfill on (re)connect and as the polling fallback
+    def _backfill(self):
+        rollbacks = self.indexer.rollbacks
+        new_events = self.indexer.sync()
+        self.head = self.indexer.last_block
+        if new_events or self.indexer.rollbacks != rollbacks or not self.trials:
+            self._reload_all()
+
+    async def _run(self):
+        backoff = 1
+        while True:
+            try:
+                await self._session()
+                backoff = 1
+            except Exception as e:
+                self.last_error = str(e)
+            # WebSocket down: keep the view current by polling until the next reconnect attempt
+            self.mode = POLLING
+            deadline = time.time() + backoff
+            while True:
+                try:
+                    await asyncio.to_thread(self._backfill)
+                except Exception as e:
+                    self.last_error = str(e)
+                if time.time() >= deadline:
+                    break
+                await asyncio.sleep(min(self.poll_interval, max(0, deadline - time.time())))
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    async def _session(self):
+        import websockets  # imported lazily so HTTP-only setups still work
+        async with websockets.connect(self.ws_url, max_size=None) as socket:
+            for request in ({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads']},
+                            {'jsonrpc': '2.0', 'id': 2, 'method': 'eth_subscribe', 'params': ['logs', {
+                                'address': contract_address,
+                                'topics': [[Web3.to_hex(topic) for topic in _events_by_topic]],
+                            }]}):
+                data = json.dumps(request)
+                registry.inc('medchain_rpc_bytes_total', len(data), method='eth_subscribe', direction='sent')
+                await socket.send(data)
+            # Anything mined while we were disconnected is picked up here
+            await asyncio.to_thread(self._backfill)
+            self.mode = WEBSOCKET
+            self.last_error = None
+            async for message in socket:
+                payload = json.loads(message)
+                registry.inc('medchain_rpc_bytes_total', len(message), method=payload.get('method', 'eth_subscribe'),
+                             direction='received')
+                if payload.get('method') != 'eth_subscription':
+                    if 'error' in payload:
+                        raise Exception(payload['error'].get('message', 'Subscription failed'))
+                    continue
+                result = payload['params']['result']
+                if 'topics' in result:
+                    decoded = decode_event_log(result)
+                    if decoded is not None:
+                        self._dirty.add(decoded[1]['id'])
+                        if int(result['blockNumber'], 16) <= self.indexer.last_block:
+                            # Log arrived after its block was indexed: apply it now
+                            await asyncio.to_thread(self._on_new_head)
+                elif 'number' in result:
+                    self.head = int(result['number'], 16)
+                    await asyncio.to_thread(self._on_new_head)
+
+    # Index the new block over HTTP, then refresh only the trials its logs touched
+    def _on_new_head(self):
+        rollbacks = self.indexer.rollbacks
+        self.indexer.sync()
+        if self.indexer.rollbacks != rollbacks:
+            self._reload_all()  # reorg rolled the index back
+        dirty, self._dirty = self._dirty, set()
+        self._refresh(dirty)
@@ -0,0 +1,214 @@
+# metrics.py
+# Latency histograms, counters and optional tracing spans for RPC, transaction and IPFS calls,
+# exported in the Prometheus text format.
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_TRACES = 20  # most recent finished traces kept for the debug panel
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    # Estimate a quantile by interpolating inside the bucket that contains it
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for count, upper in zip(self.counts, list(self.buckets) + [None]):
+            if seen + count >= rank and count:
+                if upper is None:
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper if upper is not None else lower
+        return lower
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{str(value)}"' for key, value in labels) + '}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.traces = []
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render_prometheus(self):
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        typed = set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_label_text(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_label_text(labels)} {histogram.sum}')
+            lines.append(f'{name}_count{_label_text(labels)} {histogram.count}')
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{_label_text(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    # One row per histogram series for display: count, mean and estimated percentiles in ms
+    def latency_summary(self):
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        rows = []
+        for (name, labels), histogram in histograms:
+            rows.append({
+                'Metric': name,
+                'Labels': ', '.join(f'{key}={value}' for key, value in labels),
+                'Count': histogram.count,
+                'Mean (ms)': histogram.sum / histogram.count * 1000 if histogram.count else None,
+                'p50 (ms)': (histogram.quantile(0.5) or 0) * 1000,
+                'p99 (ms)': (histogram.quantile(0.99) or 0) * 1000,
+            })
+        return rows
+
+    def counter_summary(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+        return [{'Metric': name, 'Labels': ', '.join(f'{key}={value}' for key, value in labels), 'Value': value}
+                for (name, labels), value in counters]
+
+    def add_trace(self, trace):
+        with self.lock:
+            self.traces.append(trace)
+            del self.traces[:-MAX_TRACES]
+
+    def recent_traces(self):
+        with self.lock:
+            return list(reversed(self.traces))
+
+
+registry = MetricsRegistry()
+
+_current_trace = contextvars.ContextVar('medchain_trace', default=None)
+_current_span = contextvars.ContextVar('medchain_span', default=None)
+
+
+# Collect every span recorded in this context (and worker contexts copied from it) under one trace
+@contextmanager
+def trace(name, **attributes):
+    record = {'name': name, 'attributes': attributes, 'start': time.time(), 'duration': None, 'spans': []}
+    trace_token = _current_trace.set(record)
+    span_token = _current_span.set(None)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['duration'] = time.perf_counter() - started
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        registry.add_trace(record)
+
+
+# Record a span in the active trace, if any
+@contextmanager
+def span(name, **attributes):
+    record = _current_trace.get()
+    if record is None:
+        yield None
+        return
+    entry = {'name': name, 'attributes': attributes, 'parent': _current_span.get(),
+             'offset': time.time() - record['start'], 'duration': None, 'error': None}
+    token = _current_span.set(name)
+    started = time.perf_counter()
+    try:
+        yield entry
+    except Exception as e:
+        entry['error'] = str(e)
+        raise
+    finally:
+        entry['duration'] = time.perf_counter() - started
+        _current_span.reset(token)
+        record['spans'].append(entry)
+
+
+# Time a call into the `<name>_seconds` histogram, counting failures in `<name>_errors_total`;
+# usable as a context manager or a decorator
+@contextmanager
+def timed(name, **labels):
+    started = time.perf_counter()
+    try:
+        with span(name, **labels):
+            yield
+    except Exception:
+        registry.inc(f'{name}_errors_total', **labels)
+        raise
+    finally:
+        registry.observe(f'{name}_seconds', time.perf_counter() - started, **labels)
+
+
+# Run fn in a copy of the caller's context so spans from worker threads land in the caller's trace
+def bind_context(fn):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+# Serve registry.render_prometheus() at /metrics on a background thread
+def serve_metrics(port, host='127.0.0.1'):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
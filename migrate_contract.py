@@ -0,0 +1,54 @@
+# migrate_contract.py
+# Copies every trial from a deployment of the original (string CID) ClinicalTrials contract
+# into the compact deployment configured in interact_with_contract.py.
+import argparse
+import json
+from interact_with_contract import web3, contract, transaction_manager, to_contract_hash
+
+MIGRATION_BATCH_SIZE = 50  # trials per migrateTrials transaction
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate trials from a legacy ClinicalTrials deployment.")
+    parser.add_argument('legacy_address', help="Address of the legacy ClinicalTrials contract")
+    parser.add_argument('--account', help="Owner account of the new contract (defaults to the first node account)")
+    parser.add_argument('--close', action='store_true', help="Close migration on the new contract when done")
+    args = parser.parse_args()
+
+    with open('legacy_abi.json', 'r') as file:
+        legacy_abi = json.load(file)
+    legacy = web3.eth.contract(address=web3.to_checksum_address(args.legacy_address), abi=legacy_abi)
+    account = args.account or web3.eth.accounts[0]
+
+    # New trials are rejected while migration is open, so trialCount is exactly the number migrated so far
+    already_migrated = contract.functions.trialCount().call()
+    if not contract.functions.migrationOpen().call():
+        if already_migrated:
+            raise Exception("Migration is closed and the new contract already has trials")
+        transaction_manager.wait(transaction_manager.submit(contract.functions.openMigration(), account, label="Open migration"))
+
+    legacy_count = legacy.functions.trialCount().call()
+    print(f"Legacy trials: {legacy_count}, already on new contract: {already_migrated}")
+
+    tx_hashes = []
+    for start in range(already_migrated + 1, legacy_count + 1, MIGRATION_BATCH_SIZE):
+        batch = []
+        for trial_id in range(start, min(start + MIGRATION_BATCH_SIZE, legacy_count + 1)):
+            trial = legacy.functions.getTrial(trial_id).call()
+            batch.append((trial[0], trial[1], to_contract_hash(trial[2]), trial[3], trial[4], trial[5], trial[6]))
+        tx_hashes.append(transaction_manager.submit(contract.functions.migrateTrials(batch), account,
+                                                    label=f"Migrate trials {start}-{start + len(batch) - 1}"))
+
+    for tx_hash in tx_hashes:
+        receipt = transaction_manager.wait(tx_hash)
+        if receipt['status'] != 1:
+            raise Exception(f"Migration transaction {tx_hash} reverted")
+
+    if args.close:
+        transaction_manager.wait(transaction_manager.submit(contract.functions.closeMigration(), account, label="Close migration"))
+
+    print(f"Migrated {legacy_count - already_migrated} trials in {len(tx_hashes)} transactions.")
+
+
+if __name__ == '__main__':
+    main()
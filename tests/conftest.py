@@ -0,0 +1,4 @@
+import os
+
+# Modules load the contract ABI and deployment manifest relative to the working directory
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
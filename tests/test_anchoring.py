@@ -0,0 +1,131 @@
+import pytest
+from web3.exceptions import TransactionNotFound
+import anchoring
+from anchoring import ANCHORED, PENDING, SUBMITTED, Anchorer, build_tree, compute_root, leaf_hash
+
+
+def cids(count):
+    return [f"Qm{index:044d}" for index in range(count)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 4, 5, 7, 8, 9, 16, 33])
+def test_every_proof_folds_back_to_the_root(size):
+    leaves = [leaf_hash(cid) for cid in cids(size)]
+    root, proofs = build_tree(leaves)
+    assert len(proofs) == size
+    for leaf, proof in zip(leaves, proofs):
+        assert compute_root(leaf, proof) == root
+
+
+def test_proof_does_not_verify_another_leaf():
+    leaves = [leaf_hash(cid) for cid in cids(5)]
+    root, proofs = build_tree(leaves)
+    assert compute_root(leaves[1], proofs[0]) != root
+    assert compute_root(leaf_hash("QmNotInTheBatch"), proofs[0]) != root
+
+
+def test_leaf_hash_differs_from_inner_node_hash():
+    leaves = [leaf_hash(cid) for cid in cids(2)]
+    root, _ = build_tree(leaves)
+    assert leaf_hash(cids(1)[0]) != root
+
+
+def test_empty_tree_is_rejected():
+    with pytest.raises(ValueError):
+        build_tree([])
+
+
+class FakeManager:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.submitted = []
+
+    def submit(self, call, account, label=None):
+        if self.fail:
+            raise RuntimeError("node unavailable")
+        self.submitted.append(call)
+        return f"0x{len(self.submitted):064x}"
+
+
+class FakeEvent:
+    def process_receipt(self, receipt, errors=None):
+        return [{'args': {'batchId': receipt['batchId']}}]
+
+
+class FakeContract:
+    class functions:
+        @staticmethod
+        def anchorRoot(root, leaf_count):
+            return ('anchorRoot', root, leaf_count)
+
+    class events:
+        RootAnchored = FakeEvent
+
+
+class FakeEth:
+    def __init__(self):
+        self.receipts = {}
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+
+class FakeWeb3:
+    def __init__(self):
+        self.eth = FakeEth()
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    manager, web3 = FakeManager(), FakeWeb3()
+    monkeypatch.setattr(anchoring, 'has_function', lambda name: True)
+    monkeypatch.setattr(anchoring, 'contract', FakeContract)
+    monkeypatch.setattr(anchoring, 'transaction_manager', manager)
+    monkeypatch.setattr(anchoring, 'web3', web3)
+    return manager, web3
+
+
+def states(anchorer):
+    return {record['cid']: record['state'] for record in anchorer.list_records()}
+
+
+def test_flush_submits_pending_once_and_settles_from_the_receipt(tmp_path, chain):
+    manager, web3 = chain
+    anchorer = Anchorer(str(tmp_path / 'anchors.db'))
+    for cid in cids(3):
+        anchorer.add(cid, label='P1')
+
+    tx_hash = anchorer.flush('0xabc')
+    assert anchorer.pending_count() == 0
+    assert anchorer.flush('0xabc') is None
+    assert len(manager.submitted) == 1
+    assert set(states(anchorer).values()) == {SUBMITTED}
+
+    assert anchorer.settle() == []
+    web3.eth.receipts[tx_hash] = {'status': 1, 'batchId': 7}
+    assert anchorer.settle() == [7]
+    assert set(states(anchorer).values()) == {ANCHORED}
+
+    _, root, _ = manager.submitted[0]
+    for cid in cids(3):
+        inclusion = anchorer.proof(cid)
+        assert inclusion['batch_id'] == 7
+        assert compute_root(leaf_hash(cid), inclusion['proof']) == root
+
+
+def test_reverted_or_unsent_batches_return_to_pending(tmp_path, chain):
+    manager, web3 = chain
+    anchorer = Anchorer(str(tmp_path / 'anchors.db'))
+    anchorer.add(cids(1)[0])
+
+    tx_hash = anchorer.flush('0xabc')
+    web3.eth.receipts[tx_hash] = {'status': 0}
+    assert anchorer.settle() == []
+    assert states(anchorer) == {cids(1)[0]: PENDING}
+
+    manager.fail = True
+    with pytest.raises(RuntimeError):
+        anchorer.flush('0xabc')
+    assert states(anchorer) == {cids(1)[0]: PENDING}
@@ -0,0 +1,71 @@
+import io
+import pytest
+import bulk_import
+from bulk_import import REGISTERED, REJECTED, SUBMITTED, UPLOADED, BulkImporter, ImportJournal
+from validation import REQUIRED_COLUMNS, parse_roster_file
+
+
+class FlakySubmitter:
+    # Stands in for submit_create_trial, failing on the nth record
+    def __init__(self, fail_at):
+        self.fail_at = fail_at
+        self.sent = []
+
+    def __call__(self, patient_id, cid, account):
+        if len(self.sent) == self.fail_at:
+            raise RuntimeError("node unavailable")
+        self.sent.append(patient_id)
+        return f"0x{len(self.sent):064x}"
+
+
+def test_failed_per_record_submission_only_requeues_unsent_records(tmp_path, monkeypatch):
+    submitter = FlakySubmitter(fail_at=2)
+    monkeypatch.setattr(bulk_import, 'has_function', lambda name: False)
+    monkeypatch.setattr(bulk_import, 'submit_create_trial', submitter)
+    journal = ImportJournal(str(tmp_path / 'journal.db'))
+    journal.add_records([('sha', row, f"P{row}", f"Qm{row}") for row in range(5)])
+    importer = BulkImporter(journal, '0xabc', client=object(), workers=1, batch_size=5)
+
+    with pytest.raises(RuntimeError):
+        importer._submit(flush=True)
+
+    assert journal.counts() == {SUBMITTED: 2, UPLOADED: 3}
+    assert sorted(seqs[0] for seqs in importer.in_flight.values()) == [record[0] for record in journal.records_in(SUBMITTED)]
+    assert [patient_id for _, patient_id, _ in journal.take_unsubmitted(5)] == ["P2", "P3", "P4"]
+
+
+class StalePollerManager:
+    # Receipts are mined, but the background poller has not caught up with them yet
+    def __init__(self, receipts):
+        self.receipts = receipts
+
+    def wait(self, tx_hash, timeout=120):
+        return self.receipts[tx_hash]
+
+    def status(self, tx_hash):
+        return {'state': 'pending', 'receipt': None, 'error': None}
+
+
+def test_run_settles_final_batches_from_their_receipts(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_import, 'transaction_manager', StalePollerManager({'0x1': {'status': 1}, '0x2': {'status': 0}}))
+    journal = ImportJournal(str(tmp_path / 'journal.db'))
+    journal.add_records([('sha', row, f"P{row}", f"Qm{row}") for row in range(3)])
+    journal.set_state([1, 2], SUBMITTED, '0x1')
+    journal.set_state([3], SUBMITTED, '0x2')
+    importer = BulkImporter(journal, '0xabc', client=object(), workers=1, out=io.StringIO())
+    importer.in_flight = {'0x1': [1, 2], '0x2': [3]}
+
+    stats = importer.run([])
+
+    assert journal.counts() == {REGISTERED: 2, REJECTED: 1}
+    assert (stats['registered'], stats['rejected']) == (2, 1)
+    assert importer.in_flight == {}
+
+
+def test_parsed_rosters_keep_leading_zero_patient_ids(tmp_path):
+    path = tmp_path / 'roster.csv'
+    row = ("Ann Lee,Diabetes,1980-05-01,Female,Type 2,Control,Metformin,500,2024-01-01,2025-01-01,120")
+    path.write_text(",".join(REQUIRED_COLUMNS + ["Blood Sugar Level"]) + f"\n007,{row}\n7,{row}\n")
+    result = parse_roster_file(str(path))
+    assert result['errors'] == {}
+    assert result['valid']["Patient ID"].tolist() == ["007", "7"]
@@ -0,0 +1,35 @@
+import hashlib
+import pytest
+from cid import EMPTY_DIGEST, b58decode, b58encode, bytes32_to_cid, cid_to_bytes32
+
+CID = 'QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPbdG'
+
+
+def test_cid_round_trips_through_bytes32():
+    digest = cid_to_bytes32(CID)
+    assert len(digest) == 32
+    assert bytes32_to_cid(digest) == CID
+
+
+def test_digest_is_the_sha2_256_multihash_body():
+    digest = hashlib.sha256(b'medchain').digest()
+    assert cid_to_bytes32(bytes32_to_cid(digest)) == digest
+
+
+def test_empty_cid_maps_to_the_zero_digest():
+    assert cid_to_bytes32('') == EMPTY_DIGEST
+    assert bytes32_to_cid(EMPTY_DIGEST) == ''
+
+
+@pytest.mark.parametrize('data', [b'', b'\0', b'\0\0\x01', b'hello world', bytes(range(40))])
+def test_base58_round_trip_keeps_leading_zeros(data):
+    assert b58decode(b58encode(data)) == data
+
+
+def test_rejects_invalid_base58_and_non_v0_cids():
+    with pytest.raises(ValueError):
+        b58decode('Qm0OIl')
+    with pytest.raises(ValueError):
+        cid_to_bytes32(b58encode(b'\x12\x20' + bytes(31)))
+    with pytest.raises(ValueError):
+        cid_to_bytes32('bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi')
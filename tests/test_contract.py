@@ -0,0 +1,108 @@
+import json
+import pytest
+
+pytest.importorskip('eth_tester')
+
+from web3 import Web3, EthereumTesterProvider
+from web3.exceptions import ContractLogicError
+import interact_with_contract as chain
+from anchoring import build_tree, leaf_hash
+from cid import cid_to_bytes32
+from deploy_contract import COMPILED_FILE
+
+CID_A = 'QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPbdG'
+CID_B = 'QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'
+
+with open(COMPILED_FILE, 'r') as file:
+    COMPILED = json.load(file)['contracts']['ClinicalTrials.sol']['ClinicalTrials']
+
+# These cover the current contract source; they run once compiled_code.json has been rebuilt from it
+pytestmark = pytest.mark.skipif(
+    not any(entry.get('name') == 'verifyAnchored' for entry in COMPILED['abi']),
+    reason="compiled_code.json predates the current contract source; rebuild it with "
+           "`python deploy_contract.py --compile-only`")
+
+
+@pytest.fixture
+def deployment(monkeypatch):
+    w3 = Web3(EthereumTesterProvider())
+    owner, other = w3.eth.accounts[:2]
+
+    def transact(function_call, account=owner):
+        return w3.eth.wait_for_transaction_receipt(function_call.transact({'from': account}))
+
+    receipt = transact(w3.eth.contract(abi=COMPILED['abi'], bytecode=COMPILED['evm']['bytecode']['object']).constructor())
+    contract = w3.eth.contract(address=receipt.contractAddress, abi=COMPILED['abi'])
+    monkeypatch.setattr(chain, 'contract', contract)
+    monkeypatch.setattr(chain, 'stores_cid_digests', True)
+    return contract, transact, owner, other
+
+
+def create(transact, contract, count):
+    transact(contract.functions.createTrials([f"P{n}" for n in range(1, count + 1)], [cid_to_bytes32(CID_A)] * count))
+
+
+def test_get_trials_pages_stay_within_bounds(deployment):
+    contract, transact, _, _ = deployment
+    create(transact, contract, 3)
+
+    def page(start, count):
+        return [trial[0] for trial in contract.functions.getTrials(start, count).call()]
+
+    assert page(1, 2) == [1, 2]
+    assert page(2, 10) == [2, 3]
+    assert page(3, 1) == [3]
+    assert page(4, 1) == []
+    assert page(1, 0) == []
+    with pytest.raises(ContractLogicError):
+        page(0, 1)
+
+
+def test_create_trials_rejects_mismatched_lengths(deployment):
+    contract, transact, _, _ = deployment
+    with pytest.raises(ContractLogicError):
+        transact(contract.functions.createTrials(["P1", "P2"], [cid_to_bytes32(CID_A)]))
+    assert contract.functions.trialCount().call() == 0
+
+
+def test_new_trials_are_rejected_while_migration_is_open(deployment):
+    contract, transact, owner, _ = deployment
+    transact(contract.functions.openMigration())
+    with pytest.raises(ContractLogicError):
+        transact(contract.functions.createTrial("P1", cid_to_bytes32(CID_A)))
+
+    migrated = (1, "P9", cid_to_bytes32(CID_B), 1, owner, 100, 200)
+    with pytest.raises(ContractLogicError):
+        transact(contract.functions.migrateTrials([(2,) + migrated[1:]]))  # out of ID order
+    transact(contract.functions.migrateTrials([migrated]))
+    transact(contract.functions.closeMigration())
+    transact(contract.functions.createTrial("P1", cid_to_bytes32(CID_A)))
+
+    assert contract.functions.trialCount().call() == 2
+    assert chain.get_trial(1)[1:] == ("P9", CID_B, 1, owner, 100, 200)
+    with pytest.raises(ContractLogicError):
+        transact(contract.functions.openMigration())  # only an empty contract can be migrated into
+
+
+def test_cid_round_trips_through_get_trial(deployment):
+    contract, transact, owner, _ = deployment
+    transact(contract.functions.createTrial("P1", chain.to_contract_hash(CID_A)))
+    transact(contract.functions.updateTrial(1, chain.to_contract_hash(CID_B), 2))
+    trial = chain.get_trial(1)
+    assert trial[:5] == (1, "P1", CID_B, 2, owner)
+    assert chain.get_trial_range(1, 1) == [trial]
+
+
+def test_verify_anchored_accepts_build_tree_proofs(deployment):
+    contract, transact, _, other = deployment
+    cids = [f"Qm{index:044d}" for index in range(5)]
+    leaves = [leaf_hash(cid) for cid in cids]
+    root, proofs = build_tree(leaves)
+    transact(contract.functions.anchorRoot(root, len(leaves)))
+
+    for leaf, proof in zip(leaves, proofs):
+        assert contract.functions.verifyAnchored(1, leaf, proof).call()
+    assert not contract.functions.verifyAnchored(1, leaf_hash("QmNotInTheBatch"), proofs[0]).call()
+    assert not contract.functions.verifyAnchored(2, leaves[0], proofs[0]).call()
+    with pytest.raises(ContractLogicError):
+        transact(contract.functions.anchorRoot(root, 1), account=other)  # not an authorized researcher
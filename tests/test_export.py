@@ -0,0 +1,72 @@
+import gzip
+import json
+import pandas as pd
+import pytest
+from export import EXPORT_COLUMNS, EXTRA_COLUMN, conform, write_export
+
+RESEARCHER = '0x0000000000000000000000000000000000000001'
+
+
+class FakeClient:
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get_many(self, cids):
+        results = []
+        for cid in cids:
+            if cid in self.frames:
+                results.append((cid, self.frames[cid].copy(), None))
+            else:
+                results.append((cid, None, Exception(f"missing {cid}")))
+        return results
+
+
+def record(patient_id, **extra):
+    return pd.DataFrame([{"Trial Name": f"{patient_id} - Diabetes", "Disease": "Diabetes", "Patient ID": patient_id,
+                          "Age": 40, "Blood Sugar Level": 120, **extra}])
+
+
+def test_conform_maps_records_onto_the_export_schema():
+    df = conform(pd.DataFrame([{"Patient ID": "P1", "Age": "unknown", "Start Date": "2024-01-02", "Ward": "B"}]))
+    assert list(df.columns) == EXPORT_COLUMNS
+    assert df["Age"].dtype == "Int64" and df["Age"].isna().all()
+    assert df["Start Date"].iloc[0] == pd.Timestamp(2024, 1, 2)
+    assert json.loads(df[EXTRA_COLUMN].iloc[0]) == {"Ward": "B"}
+    assert df["Patient ID"].dtype == "string"
+
+
+def test_conform_leaves_extra_fields_empty_without_unknown_columns():
+    df = conform(record("P1"))
+    assert df[EXTRA_COLUMN].isna().all()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "csv.gz"])
+def test_write_export_streams_chunks_and_reports_missing_records(tmp_path, fmt):
+    client = FakeClient({"cid1": record("P1"), "cid2": record("P2", Ward="B")})
+    trials = [(1, "P1", "cid1", 0, RESEARCHER, 0, 0), (2, "P2", "cid2", 1, RESEARCHER, 0, 0),
+              (3, "P3", "cid3", 0, RESEARCHER, 0, 0)]
+    errors = []
+    path = tmp_path / f"export.{fmt}"
+    rows = write_export(trials, str(path), fmt, chunk_size=2, client=client,
+                        on_error=lambda trial, error: errors.append(trial[0]))
+
+    assert rows == 2 and errors == [3]
+    with (gzip.open(path, 'rt') if fmt == 'csv.gz' else open(path)) as file:
+        exported = pd.read_csv(file)
+    assert list(exported.columns) == EXPORT_COLUMNS
+    assert exported["Trial ID"].tolist() == [1, 2]
+    assert exported["Status"].tolist() == ["Active", "Completed"]
+    assert exported["Trial Name"].tolist() == ["Trial ID 1 - P1 - Diabetes", "Trial ID 2 - P2 - Diabetes"]
+
+
+def test_write_export_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    client = FakeClient({"cid1": record("P1")})
+    path = tmp_path / "export.parquet"
+    assert write_export([(1, "P1", "cid1", 0, RESEARCHER, 0, 0)], str(path), 'parquet', client=client) == 1
+    assert pd.read_parquet(path)["Patient ID"].tolist() == ["P1"]
+
+
+def test_write_export_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        write_export([], str(tmp_path / "export.xlsx"), 'xlsx', client=FakeClient({}))
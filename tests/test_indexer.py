@@ -0,0 +1,135 @@
+import json
+import time
+import pytest
+
+pytest.importorskip('eth_tester')
+
+from web3 import Web3, EthereumTesterProvider
+import interact_with_contract as chain
+import indexer
+from indexer import REORG_WINDOW
+from deploy_contract import COMPILED_FILE
+
+CID_A = 'QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPbdG'
+CID_B = 'QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'
+
+
+def deploy(w3):
+    with open(COMPILED_FILE, 'r') as file:
+        bytecode = json.load(file)['contracts']['ClinicalTrials.sol']['ClinicalTrials']['evm']['bytecode']['object']
+    account = w3.eth.accounts[0]
+
+    def transact(function_call):
+        return w3.eth.wait_for_transaction_receipt(function_call.transact({'from': account}))
+
+    receipt = transact(w3.eth.contract(abi=chain.abi, bytecode=bytecode).constructor())
+    return w3.eth.contract(address=receipt.contractAddress, abi=chain.abi), transact, receipt
+
+
+@pytest.fixture
+def deployment(tmp_path, monkeypatch):
+    w3 = Web3(EthereumTesterProvider())
+    contract, transact, receipt = deploy(w3)
+    monkeypatch.setattr(indexer, 'web3', w3)
+    monkeypatch.setattr(indexer, 'contract_address', receipt.contractAddress)
+    monkeypatch.setattr(indexer, 'deployment_block', receipt.blockNumber)
+
+    trial_indexer = indexer.TrialIndexer(db_path=str(tmp_path / 'index.db'))
+    return w3, contract, transact, trial_indexer
+
+
+# A fresh chain with the contract redeployed at the same address, like a restarted non-persistent Ganache
+def restart_chain(w3, monkeypatch):
+    genesis = w3.eth.get_block(0)['hash']
+    restarted = Web3(EthereumTesterProvider())
+    while restarted.eth.get_block(0)['hash'] == genesis:
+        time.sleep(0.1)
+        restarted = Web3(EthereumTesterProvider())
+    contract, transact, _ = deploy(restarted)
+    monkeypatch.setattr(indexer, 'web3', restarted)
+    return restarted, contract, transact
+
+
+def test_sync_indexes_created_and_updated_trials(deployment):
+    w3, contract, transact, trial_indexer = deployment
+    transact(contract.functions.createTrial('P1', chain.to_contract_hash(CID_A)))
+    transact(contract.functions.createTrial('P2', chain.to_contract_hash(CID_A)))
+    transact(contract.functions.updateTrial(2, chain.to_contract_hash(CID_B), 1))
+
+    assert trial_indexer.sync() == 3
+    assert trial_indexer.count_trials() == 2
+    assert trial_indexer.get_trial(2)[1:4] == ('P2', CID_B, 1)
+    assert [trial[0] for trial in trial_indexer.list_trials(status=0)] == [1]
+    assert [trial[0] for trial in trial_indexer.list_trials(patient_id='P2')] == [2]
+    assert trial_indexer.sync() == 0
+
+
+def test_rollback_rebuilds_trials_from_remaining_events(deployment):
+    w3, contract, transact, trial_indexer = deployment
+    created = transact(contract.functions.createTrial('P1', chain.to_contract_hash(CID_A)))
+    transact(contract.functions.updateTrial(1, chain.to_contract_hash(CID_B), 2))
+    trial_indexer.sync()
+
+    trial_indexer.rollback(created.blockNumber)
+    assert trial_indexer.get_trial(1)[2:4] == (CID_A, 0)
+    assert [event[1] for event in trial_indexer.trial_events(1)] == ['TrialCreated']
+    assert trial_indexer.rollbacks == 1
+
+    # Re-syncing replays the rolled back update
+    assert trial_indexer.sync() == 1
+    assert trial_indexer.get_trial(1)[2:4] == (CID_B, 2)
+
+
+def test_sync_rolls_back_when_the_indexed_tip_was_reorganised(deployment):
+    w3, contract, transact, trial_indexer = deployment
+    transact(contract.functions.createTrial('P1', chain.to_contract_hash(CID_A)))
+    transact(contract.functions.updateTrial(1, chain.to_contract_hash(CID_B), 1))
+    trial_indexer.sync()
+
+    # Pretend the block we last indexed has since been replaced
+    with trial_indexer.conn:
+        trial_indexer.conn.execute('UPDATE blocks SET hash = ? WHERE number = ?', ('0x' + '00' * 32, trial_indexer.last_block))
+    trial_indexer.sync()
+
+    assert trial_indexer.rollbacks == 1
+    assert trial_indexer.count_trials() == 1
+    assert trial_indexer.get_trial(1)[2:4] == (CID_B, 1)
+    assert len(trial_indexer.trial_events(1)) == 2
+
+
+def test_index_starts_at_the_deployment_block(deployment):
+    w3, contract, transact, trial_indexer = deployment
+    assert trial_indexer.start_block == indexer.deployment_block
+    assert trial_indexer.last_block == indexer.deployment_block - 1
+
+
+def test_sync_resets_the_index_when_the_chain_restarts_shorter(deployment, monkeypatch):
+    w3, contract, transact, trial_indexer = deployment
+    for patient_id in ('P1', 'P2', 'P3'):
+        transact(contract.functions.createTrial(patient_id, chain.to_contract_hash(CID_A)))
+    trial_indexer.sync()
+
+    restarted, contract, transact = restart_chain(w3, monkeypatch)
+    assert restarted.eth.block_number < trial_indexer.last_block
+    trial_indexer.sync()
+    assert trial_indexer.count_trials() == 0
+
+    transact(contract.functions.createTrial('Q1', chain.to_contract_hash(CID_B)))
+    trial_indexer.sync()
+    assert [trial[1] for trial in trial_indexer.list_trials()] == ['Q1']
+
+
+def test_sync_resets_the_index_when_the_chain_restarts_longer(deployment, monkeypatch):
+    w3, contract, transact, trial_indexer = deployment
+    transact(contract.functions.createTrial('P1', chain.to_contract_hash(CID_A)))
+    transact(contract.functions.createTrial('P2', chain.to_contract_hash(CID_A)))
+    for _ in range(REORG_WINDOW + 2):
+        transact(contract.functions.authorizeResearcher(w3.eth.accounts[1]))
+    trial_indexer.sync()
+
+    restarted, contract, transact = restart_chain(w3, monkeypatch)
+    for _ in range(REORG_WINDOW + 5):
+        transact(contract.functions.authorizeResearcher(restarted.eth.accounts[1]))
+    transact(contract.functions.createTrial('Q1', chain.to_contract_hash(CID_B)))
+    trial_indexer.sync()
+    assert [trial[1] for trial in trial_indexer.list_trials()] == ['Q1']
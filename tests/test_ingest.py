@@ -0,0 +1,59 @@
+import io
+import pandas as pd
+import pytest
+from ingest import infer_schema, iter_chunks, scan_csv, convert_csv
+from ipfs import PARQUET
+
+
+def csv_file(rows):
+    return io.BytesIO(pd.DataFrame(rows).to_csv(index=False).encode('utf-8'))
+
+
+def test_infer_schema_uses_nullable_dtypes():
+    sample = pd.DataFrame({'id': [1, 2], 'score': [1.5, None], 'flag': [True, False], 'name': ['a', 'b']})
+    assert infer_schema(sample) == {'id': 'Int64', 'score': 'Float64', 'flag': 'boolean', 'name': 'string'}
+
+
+def test_scan_csv_counts_rows_and_bounds_the_preview():
+    file = csv_file({'id': range(25), 'name': ['x'] * 25})
+    scan = scan_csv(file, chunk_rows=10, sample_rows=5, preview_rows=3)
+    assert scan['row_count'] == 25
+    assert len(scan['preview']) == 3
+    assert scan['columns'] == ['id', 'name']
+
+
+def test_values_drifting_from_the_sampled_schema_are_coerced_and_counted():
+    rows = {'id': list(range(30)), 'score': [1.5] * 30, 'flag': ['true'] * 30}
+    rows['id'][25] = 'unknown'
+    rows['score'][26] = 'pending'
+    rows['flag'][27] = 'maybe'
+    file = csv_file(rows)
+    schema = scan_csv(file, sample_rows=10)['schema']
+    assert schema == {'id': 'Int64', 'score': 'Float64', 'flag': 'boolean'}
+
+    coerced = {}
+    df = pd.concat(iter_chunks(file, schema, chunk_rows=10, coerced=coerced))
+    assert coerced == {'id': 1, 'score': 1, 'flag': 1}
+    assert df['id'].dtype == 'Int64' and df['id'].isna().sum() == 1
+    assert df['flag'].dtype == 'boolean' and df['flag'].sum() == 29
+
+
+def test_blank_cells_are_missing_but_not_counted_as_coerced():
+    file = io.BytesIO(b'id,name\n1,a\n,b\n3,\n')
+    coerced = {}
+    df = pd.concat(iter_chunks(file, {'id': 'Int64', 'name': 'string'}, coerced=coerced))
+    assert coerced == {}
+    assert df['id'].isna().tolist() == [False, True, False]
+
+
+def test_convert_csv_writes_one_parquet_schema_across_drifting_chunks(tmp_path):
+    pytest.importorskip('pyarrow')
+    rows = {'id': [str(i) for i in range(30)]}
+    rows['id'][20] = 'unknown'
+    file = csv_file(rows)
+    path = tmp_path / 'data.parquet'
+    coerced = {}
+    convert_csv(file, str(path), PARQUET, {'id': 'Int64'}, chunk_rows=10, coerced=coerced)
+    result = pd.read_parquet(path)
+    assert len(result) == 30 and coerced == {'id': 1}
+    assert result['id'].isna().sum() == 1
@@ -0,0 +1,72 @@
+import json
+import pytest
+from web3 import Web3
+from web3._utils.http_session_manager import HTTPSessionManager
+from interact_with_contract import InstrumentedHTTPProvider, get_trials
+from metrics import registry
+
+
+def reply(request):
+    results = {'eth_blockNumber': '0x5', 'eth_call': '0x'}
+    return {'jsonrpc': '2.0', 'id': request['id'], 'result': results[request['method']]}
+
+
+@pytest.fixture
+def node(monkeypatch):
+    # Answers JSON-RPC POSTs in-process, failing when asked to
+    state = {'fail': False}
+
+    def make_post_request(self, endpoint_uri, data, **kwargs):
+        if state['fail']:
+            raise ConnectionError("node unavailable")
+        request = json.loads(data)
+        response = [reply(item) for item in request] if isinstance(request, list) else reply(request)
+        return json.dumps(response).encode('utf-8')
+
+    monkeypatch.setattr(HTTPSessionManager, 'make_post_request', make_post_request)
+    provider = InstrumentedHTTPProvider('http://127.0.0.1:8545')
+    provider.exception_retry_configuration = None
+    return Web3(provider), state
+
+
+def counter(name, **labels):
+    return registry.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def latency_count(method):
+    histogram = registry.histograms.get(('medchain_rpc_seconds', (('method', method),)))
+    return histogram.count if histogram else 0
+
+
+def test_requests_are_timed_and_counted_by_method(node):
+    w3, _ = node
+    sent = counter('medchain_rpc_bytes_total', method='eth_blockNumber', direction='sent')
+    received = counter('medchain_rpc_bytes_total', method='eth_blockNumber', direction='received')
+    calls = latency_count('eth_blockNumber')
+
+    assert w3.eth.block_number == 5
+
+    assert latency_count('eth_blockNumber') == calls + 1
+    assert counter('medchain_rpc_bytes_total', method='eth_blockNumber', direction='sent') > sent
+    assert counter('medchain_rpc_bytes_total', method='eth_blockNumber', direction='received') > received
+
+
+def test_batches_are_labelled_by_their_methods(node):
+    w3, _ = node
+    calls = latency_count('batch:eth_call')
+    w3.provider.make_batch_request([('eth_call', [{'to': '0x' + '00' * 20, 'data': '0x'}, 'latest'])] * 3)
+    assert latency_count('batch:eth_call') == calls + 1
+
+
+def test_failed_requests_are_counted_as_errors(node):
+    w3, state = node
+    errors = counter('medchain_rpc_errors_total', method='eth_blockNumber')
+    state['fail'] = True
+    with pytest.raises(ConnectionError):
+        w3.eth.block_number
+    assert counter('medchain_rpc_errors_total', method='eth_blockNumber') == errors + 1
+
+
+def test_chunk_size_must_be_positive():
+    with pytest.raises(ValueError):
+        get_trials([1, 2], chunk_size=0)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import pandas as pd
+import trial_history
+from ipfs import encode_frame
+from trial_history import PATCH, SNAPSHOT, SNAPSHOT_INTERVAL, diff_versions, history, load_record, write_update
+
+
+class MemoryClient:
+    # Content-addressed in-memory stand-in for IPFSClient
+    def __init__(self):
+        self.blocks = {}
+
+    def add_bytes(self, data, filename='data'):
+        cid = 'Qm' + hashlib.sha256(data).hexdigest()
+        self.blocks[cid] = data
+        return cid
+
+    def cat(self, cid):
+        return self.blocks[cid]
+
+
+def record(**fields):
+    base = {"Trial Name": "Ann Lee - Diabetes", "Patient ID": "P1", "Medication": "Metformin", "Dosage": "500"}
+    base.update(fields)
+    return pd.DataFrame([base])
+
+
+def document(client, cid):
+    return json.loads(client.cat(cid))
+
+
+def test_updates_are_stored_as_patches_of_changed_fields():
+    client = MemoryClient()
+    root = write_update(client, None, record())
+    updated = write_update(client, root, record(Dosage="750"))
+
+    patch = document(client, updated)
+    assert patch['format'] == PATCH and patch['parent'] == root
+    assert patch['set'] == {"Dosage": "750"} and patch['unset'] == []
+    assert load_record(client, updated).iloc[0].to_dict() == record(Dosage="750").iloc[0].to_dict()
+
+
+def test_removed_fields_are_unset():
+    client = MemoryClient()
+    root = write_update(client, None, record(Notes="n/a"))
+    updated = write_update(client, root, record())
+    assert document(client, updated)['unset'] == ["Notes"]
+    assert "Notes" not in load_record(client, updated).columns
+
+
+def test_plain_payloads_are_read_as_the_root_version():
+    client = MemoryClient()
+    root = client.add_bytes(encode_frame(record()))
+    updated = write_update(client, root, record(Medication="Insulin"))
+    assert load_record(client, updated)["Medication"].iloc[0] == "Insulin"
+    assert history(client, updated) == [(updated, 1, 'patch'), (root, 0, 'snapshot')]
+
+
+def test_a_snapshot_is_written_every_interval():
+    client = MemoryClient()
+    cid = write_update(client, None, record())
+    for dosage in range(1, SNAPSHOT_INTERVAL + 1):
+        cid = write_update(client, cid, record(Dosage=str(dosage)))
+    assert document(client, cid)['format'] == SNAPSHOT
+    assert document(client, cid)['version'] == SNAPSHOT_INTERVAL
+    # Reconstruction stops at the snapshot instead of walking the whole chain
+    assert trial_history.load_record_dict(client, cid)[2] == 0
+    assert len(history(client, cid)) == SNAPSHOT_INTERVAL + 1
+
+
+def test_diff_versions_lists_changed_fields():
+    client = MemoryClient()
+    root = write_update(client, None, record())
+    updated = write_update(client, root, record(Dosage="750", Notes="titrated"))
+    diff = diff_versions(client, root, updated)
+    assert diff['Field'].tolist() == ['Dosage', 'Notes']
+    assert diff['After'].tolist() == ['750', 'titrated']
+    assert diff['Before'].iloc[0] == '500' and pd.isna(diff['Before'].iloc[1])
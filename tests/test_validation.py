@@ -0,0 +1,75 @@
+import io
+import pandas as pd
+from validation import REQUIRED_COLUMNS, build_trial_records, read_roster, restricted_gender, validate_trials
+
+
+def patient(patient_id="P1", **overrides):
+    row = {"Patient ID": patient_id, "Patient Name": "Ann Lee", "Disease": "Diabetes", "Date of Birth": "1980-05-01",
+           "Gender": "Female", "Condition": "Type 2", "Treatment Group": "Control", "Medication": "Metformin",
+           "Dosage": "500", "Start Date": "2024-01-01", "Expected End Date": "2025-01-01", "Blood Sugar Level": 120}
+    row.update(overrides)
+    return row
+
+
+def test_valid_roster_has_no_errors():
+    roster = pd.DataFrame([patient("P1"), patient("P2", Disease="Cancer", **{"Cancer Stage": "Stage II"})])
+    assert validate_trials(roster).tolist() == ["", ""]
+
+
+def test_header_only_roster_returns_an_empty_series():
+    roster = pd.read_csv(io.StringIO(",".join(REQUIRED_COLUMNS) + "\n"))
+    errors = validate_trials(roster)
+    assert isinstance(errors, pd.Series) and errors.empty
+
+
+def test_missing_and_blank_columns_are_reported():
+    roster = pd.DataFrame([patient(Dosage="")]).drop(columns=["Medication"])
+    message = validate_trials(roster).iloc[0]
+    assert "Missing column Medication" in message
+    assert "Dosage is required" in message
+
+
+def test_disease_specific_rules():
+    roster = pd.DataFrame([
+        patient("P1", **{"Blood Sugar Level": 900}),
+        patient("P2", Disease="Cardiovascular", **{"Cholesterol Level": None}),
+        patient("P3", Disease="Cancer", Gender="Female", **{"Cancer Stage": "Stage V", "Cancer Type": "Prostate Cancer (Male)"}),
+        patient("P4", Disease="Flu"),
+    ])
+    errors = validate_trials(roster)
+    assert "Blood Sugar Level must be between" in errors[0]
+    assert "Cholesterol Level is required for Cardiovascular" in errors[1]
+    assert "Unknown Cancer Stage" in errors[2] and "Gender does not match Cancer Type" in errors[2]
+    assert "Unknown disease" in errors[3]
+
+
+def test_duplicate_patient_ids_and_bad_dates():
+    roster = pd.DataFrame([patient("P1"), patient("P1", **{"Date of Birth": "someday"})])
+    errors = validate_trials(roster)
+    assert all("Duplicate Patient ID" in message for message in errors)
+    assert "Date of Birth is not a valid date" in errors[1]
+
+
+def test_restricted_gender():
+    assert restricted_gender("Ovarian Cancer (Female)") == "Female"
+    assert restricted_gender("Prostate Cancer (Male)") == "Male"
+    assert restricted_gender("Lung Cancer") is None
+    assert restricted_gender(float("nan")) is None
+
+
+def test_build_trial_records_keeps_whole_number_readings_as_integers():
+    roster = pd.DataFrame([patient("P1"), patient("P2", Disease="Hypertension", **{"Blood Sugar Level": None,
+                                                                                     "Blood Pressure": "120/80"})])
+    first, second = build_trial_records(roster)
+    assert first["Trial Name"].iloc[0] == "Ann Lee - Diabetes"
+    assert first.to_csv(index=False).splitlines()[1].endswith(",120")
+    assert "Blood Sugar Level" not in second.columns
+    assert second["Blood Pressure"].iloc[0] == "120/80"
+
+
+def test_patient_ids_keep_leading_zeros():
+    roster = read_roster(io.StringIO(pd.DataFrame([patient("007"), patient("7")]).to_csv(index=False)))
+    assert roster["Patient ID"].tolist() == ["007", "7"]
+    assert validate_trials(roster).tolist() == ["", ""]
+    records = build_trial_records(roster)
+    assert [record["Patient ID"][0] for record in records] == ["007", "7"]
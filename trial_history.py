@@ -0,0 +1,101 @@
+# trial_history.py
+# Versioned trial records: each update stores only the changed fields plus a link to its parent CID,
+# with a full snapshot every SNAPSHOT_INTERVAL versions so reconstruction never walks far.
+import json
+from datetime import date, datetime
+import pandas as pd
+from ipfs import decode_frame, is_versioned_payload
+
+PATCH = 'medchain-patch'
+SNAPSHOT = 'medchain-snapshot'
+SNAPSHOT_INTERVAL = 16  # patches between full snapshots
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if pd.isna(value):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()  # numpy scalar
+    return value
+
+
+def _encode(document):
+    return json.dumps(document, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def _load_document(client, cid):
+    data = client.cat(cid)
+    if is_versioned_payload(data):
+        return json.loads(data)
+    # A plain CSV/Parquet/Arrow payload is the root snapshot of a record written before versioning
+    return {'format': SNAPSHOT, 'version': 0, 'parent': None, 'record': _frame_to_record(decode_frame(data))}
+
+
+def _frame_to_record(df):
+    if len(df) != 1:
+        raise ValueError("Versioned trial records must contain exactly one row")
+    return {column: _json_value(value) for column, value in df.iloc[0].items()}
+
+
+# Function to rebuild the record stored at cid as a dict, returning (record, version, patches since snapshot)
+def load_record_dict(client, cid):
+    chain = []
+    document = _load_document(client, cid)
+    while document['format'] == PATCH:
+        chain.append(document)
+        document = _load_document(client, document['parent'])
+    record = dict(document['record'])
+    for patch in reversed(chain):
+        record.update(patch['set'])
+        for column in patch['unset']:
+            record.pop(column, None)
+    version = chain[0]['version'] if chain else document['version']
+    return record, version, len(chain)
+
+
+# Function to rebuild the record stored at cid as a one-row DataFrame
+def load_record(client, cid):
+    record, _, _ = load_record_dict(client, cid)
+    return pd.DataFrame({column: [value] for column, value in record.items()})
+
+
+# Function to store an updated record as a patch against parent_cid (or a snapshot when due); returns the new CID
+def write_update(client, parent_cid, updated_df):
+    record = _frame_to_record(updated_df)
+    if not parent_cid:
+        return client.add_bytes(_encode({'format': SNAPSHOT, 'version': 0, 'parent': None, 'record': record}), 'record.json')
+    parent, version, depth = load_record_dict(client, parent_cid)
+    if depth + 1 >= SNAPSHOT_INTERVAL:
+        document = {'format': SNAPSHOT, 'version': version + 1, 'parent': parent_cid, 'record': record}
+    else:
+        changed = {column: value for column, value in record.items()
+                   if column not in parent or str(parent[column]) != str(value)}
+        removed = [column for column in parent if column not in record]
+        document = {'format': PATCH, 'version': version + 1, 'parent': parent_cid, 'set': changed, 'unset': removed}
+    return client.add_bytes(_encode(document), 'record.json')
+
+
+# Function to list every version of a record, newest first, as (cid, version, kind) tuples
+def history(client, cid):
+    versions = []
+    while cid:
+        document = _load_document(client, cid)
+        versions.append((cid, document['version'], 'patch' if document['format'] == PATCH else 'snapshot'))
+        cid = document['parent']
+    return versions
+
+
+# Function to compare two versions field by field; returns a DataFrame of the fields that differ
+def diff_versions(client, old_cid, new_cid):
+    old, _, _ = load_record_dict(client, old_cid)
+    new, _, _ = load_record_dict(client, new_cid)
+    rows = []
+    for column in list(old) + [column for column in new if column not in old]:
+        before, after = old.get(column), new.get(column)
+        if str(before) != str(after):
+            rows.append({'Field': column, 'Before': before, 'After': after})
+    return pd.DataFrame(rows, columns=['Field', 'Before', 'After'])
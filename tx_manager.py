@@ -0,0 +1,122 @@
+# tx_manager.py
+import threading
+import time
+from collections import OrderedDict
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+from metrics import registry, timed
+
+PENDING = 'pending'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+
+POLL_INTERVAL = 1.0  # seconds between receipt polls
+RECEIPT_TIMEOUT = 300  # seconds before a transaction that never got mined is marked failed
+MAX_TRACKED = 1000  # finished transactions kept for the UI
+
+
+class TransactionManager:
+    # Submits transactions with locally assigned nonces and tracks their receipts in the background
+    def __init__(self, web3, poll_interval=POLL_INTERVAL, receipt_timeout=RECEIPT_TIMEOUT):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.receipt_timeout = receipt_timeout
+        self.nonces = {}
+        self.transactions = OrderedDict()
+        self.lock = threading.RLock()
+        self._wakeup = threading.Condition(self.lock)
+        self._poller = None
+
+    def _next_nonce(self, account):
+        if account not in self.nonces:
+            self.nonces[account] = self.web3.eth.get_transaction_count(account, 'pending')
+        return self.nonces[account]
+
+    # Send a contract function call without waiting for it to be mined; returns the tx hash
+    def submit(self, function_call, account, label=''):
+        with self.lock:
+            nonce = self._next_nonce(account)
+            try:
+                with timed('medchain_tx_submit'):
+                    tx_hash = Web3.to_hex(function_call.transact({'from': account, 'nonce': nonce}))
+            except Exception:
+                # Our view of the nonce may be wrong (e.g. another client used the account): resync next time
+                self.nonces.pop(account, None)
+                raise
+            self.nonces[account] = nonce + 1
+            self.transactions[tx_hash] = {
+                'hash': tx_hash,
+                'label': label,
+                'account': account,
+                'nonce': nonce,
+                'state': PENDING,
+                'submitted': time.time(),
+                'receipt': None,
+                'error': None,
+            }
+            self._ensure_poller()
+            self._wakeup.notify()
+        return tx_hash
+
+    def _ensure_poller(self):
+        if self._poller is None or not self._poller.is_alive():
+            self._poller = threading.Thread(target=self._poll_loop, name='tx-receipt-poller', daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending():
+                    self._wakeup.wait()
+                pending = self.pending()
+            for record in pending:
+                self._check(record)
+            time.sleep(self.poll_interval)
+
+    def _check(self, record):
+        try:
+            receipt = self.web3.eth.get_transaction_receipt(record['hash'])
+        except TransactionNotFound:
+            if time.time() - record['submitted'] > self.receipt_timeout:
+                self._finish(record, FAILED, error='Timed out waiting for receipt')
+            return
+        except Exception as e:
+            record['error'] = str(e)  # Transient node error: keep polling
+            registry.inc('medchain_tx_receipt_poll_errors_total')
+            return
+        if receipt['status'] == 1:
+            self._finish(record, CONFIRMED, receipt=receipt)
+        else:
+            self._finish(record, FAILED, receipt=receipt, error='Transaction reverted')
+
+    def _finish(self, record, state, receipt=None, error=None):
+        with self.lock:
+            record['state'] = state
+            record['receipt'] = receipt
+            record['error'] = error
+            registry.observe('medchain_tx_confirm_seconds', time.time() - record['submitted'], state=state)
+            if state == FAILED and receipt is None:
+                # A dropped transaction leaves a nonce gap: resync from the node
+                self.nonces.pop(record['account'], None)
+            finished = [h for h, r in self.transactions.items() if r['state'] != PENDING]
+            for tx_hash in finished[:max(0, len(finished) - MAX_TRACKED)]:
+                del self.transactions[tx_hash]
+
+    def pending(self):
+        with self.lock:
+            return [record for record in self.transactions.values() if record['state'] == PENDING]
+
+    def status(self, tx_hash):
+        with self.lock:
+            return self.transactions.get(tx_hash)
+
+    # Most recent transactions first
+    def list_transactions(self, limit=None):
+        with self.lock:
+            records = list(reversed(self.transactions.values()))
+        return records[:limit] if limit else records
+
+    # Block until a submitted transaction is mined and return its receipt
+    def wait(self, tx_hash, timeout=120):
+        with timed('medchain_tx_wait'):
+            return self.web3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
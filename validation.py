@@ -0,0 +1,162 @@
+# validation.py
+import hashlib
+import io
+import os
+from datetime import date
+import pandas as pd
+
+# Rules shared by the Create Trial form and bulk enrollment
+DISEASES = ["Diabetes", "Hypertension", "Cancer", "Cardiovascular"]
+CANCER_TYPES = ["Breast Cancer (Female)", "Ovarian Cancer (Female)", "Prostate Cancer (Male)", "Lung Cancer"]
+CANCER_STAGES = ["Stage I", "Stage II", "Stage III", "Stage IV"]
+GENDERS = ["Male", "Female", "Other"]
+TREATMENT_GROUPS = ["Control", "Experimental"]
+BLOOD_SUGAR_RANGE = (50, 500)
+CHOLESTEROL_RANGE = (100, 400)
+
+REQUIRED_COLUMNS = ["Patient ID", "Patient Name", "Disease", "Date of Birth", "Gender", "Condition",
+                    "Treatment Group", "Medication", "Dosage", "Start Date", "Expected End Date"]
+DISEASE_COLUMNS = {
+    "Diabetes": "Blood Sugar Level",
+    "Hypertension": "Blood Pressure",
+    "Cancer": "Cancer Stage",
+    "Cardiovascular": "Cholesterol Level",
+}
+# Identifiers are read as text so IDs such as "007" keep their leading zeros
+ROSTER_DTYPES = {"Patient ID": str}
+WHOLE_NUMBER_COLUMNS = ["Blood Sugar Level", "Cholesterol Level"]
+
+
+# Gender a cancer type is restricted to, if any
+def restricted_gender(cancer_type):
+    if not isinstance(cancer_type, str):
+        return None
+    if "Female" in cancer_type:
+        return "Female"
+    elif "Male" in cancer_type:
+        return "Male"
+    return None
+
+
+def _blank(series):
+    return series.isna() | (series.astype(str).str.strip() == "")
+
+
+# Validate every row of a patient roster at once; returns a Series of error messages ('' when valid)
+def validate_trials(df):
+    if df.empty:
+        return pd.Series("", index=df.index, dtype=object)
+    errors = pd.DataFrame(index=df.index)
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    for column in missing:
+        errors[f"missing {column}"] = f"Missing column {column}"
+    for column in REQUIRED_COLUMNS:
+        if column in df.columns:
+            errors[f"blank {column}"] = _blank(df[column]).map({True: f"{column} is required", False: ""})
+
+    def flag(name, mask, message):
+        errors[name] = mask.fillna(False).map({True: message, False: ""})
+
+    if "Disease" in df.columns:
+        disease = df["Disease"]
+        flag("disease", ~disease.isin(DISEASES) & ~_blank(disease), "Unknown disease")
+        for name, column in DISEASE_COLUMNS.items():
+            is_disease = disease == name
+            if column not in df.columns:
+                flag(f"{column} missing", is_disease, f"{column} is required for {name}")
+                continue
+            flag(f"{column} blank", is_disease & _blank(df[column]), f"{column} is required for {name}")
+        if "Blood Sugar Level" in df.columns:
+            level = pd.to_numeric(df["Blood Sugar Level"], errors="coerce")
+            low, high = BLOOD_SUGAR_RANGE
+            flag("blood sugar", (disease == "Diabetes") & ~level.between(low, high) & ~_blank(df["Blood Sugar Level"]),
+                 f"Blood Sugar Level must be between {low} and {high}")
+        if "Cholesterol Level" in df.columns:
+            level = pd.to_numeric(df["Cholesterol Level"], errors="coerce")
+            low, high = CHOLESTEROL_RANGE
+            flag("cholesterol", (disease == "Cardiovascular") & ~level.between(low, high) & ~_blank(df["Cholesterol Level"]),
+                 f"Cholesterol Level must be between {low} and {high}")
+        if "Cancer Stage" in df.columns:
+            flag("cancer stage", (disease == "Cancer") & ~df["Cancer Stage"].isin(CANCER_STAGES) & ~_blank(df["Cancer Stage"]),
+                 "Unknown Cancer Stage")
+        if "Cancer Type" in df.columns and "Gender" in df.columns:
+            cancer_type = df["Cancer Type"]
+            flag("cancer type", (disease == "Cancer") & ~cancer_type.isin(CANCER_TYPES) & ~_blank(cancer_type), "Unknown Cancer Type")
+            required_gender = cancer_type.map(restricted_gender)
+            flag("cancer gender", (disease == "Cancer") & required_gender.notna() & (df["Gender"] != required_gender),
+                 "Gender does not match Cancer Type")
+
+    if "Gender" in df.columns:
+        flag("gender", ~df["Gender"].isin(GENDERS) & ~_blank(df["Gender"]), "Unknown Gender")
+    if "Treatment Group" in df.columns:
+        flag("group", ~df["Treatment Group"].isin(TREATMENT_GROUPS) & ~_blank(df["Treatment Group"]), "Unknown Treatment Group")
+    for column in ["Date of Birth", "Start Date", "Expected End Date"]:
+        if column in df.columns:
+            parsed = pd.to_datetime(df[column], errors="coerce")
+            flag(f"{column} date", parsed.isna() & ~_blank(df[column]), f"{column} is not a valid date")
+    if "Date of Birth" in df.columns:
+        dob = pd.to_datetime(df["Date of Birth"], errors="coerce")
+        flag("dob range", (dob < pd.Timestamp(1900, 1, 1)) | (dob > pd.Timestamp(date.today())), "Date of Birth is out of range")
+    if "Patient ID" in df.columns:
+        flag("duplicate", df["Patient ID"].duplicated(keep=False) & ~_blank(df["Patient ID"]), "Duplicate Patient ID")
+
+    return errors.apply(lambda row: "; ".join(message for message in row if message), axis=1) if len(errors.columns) else pd.Series("", index=df.index)
+
+
+# Function to read a patient roster CSV from a path or file-like object
+def read_roster(source):
+    return pd.read_csv(source, dtype=ROSTER_DTYPES)
+
+
+# Build one record per patient in the same layout the Create Trial form uploads
+def build_trial_records(df):
+    dob = pd.to_datetime(df["Date of Birth"]).dt.date
+    ages = dob.map(lambda born: (date.today() - born).days // 365)
+    # Blank cells for other diseases make these columns float; keep whole-number readings as integers
+    measures = {}
+    for column in WHOLE_NUMBER_COLUMNS:
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors="coerce")
+            measures[column] = values.astype("Int64") if (values.dropna() % 1 == 0).all() else values
+    records = []
+    for index, row in df.iterrows():
+        record = {
+            "Trial Name": f"{row['Patient Name']} - {row['Disease']}",
+            "Disease": row["Disease"],
+            "Patient ID": row["Patient ID"],
+            "Patient Name": row["Patient Name"],
+            "Date of Birth": dob[index],
+            "Age": ages[index],
+            "Gender": row["Gender"],
+            "Condition": row["Condition"],
+            "Treatment Group": row["Treatment Group"],
+            "Medication": row["Medication"],
+            "Dosage": row["Dosage"],
+            "Start Date": pd.to_datetime(row["Start Date"]).date(),
+            "Expected End Date": pd.to_datetime(row["Expected End Date"]).date(),
+        }
+        column = DISEASE_COLUMNS[row["Disease"]]
+        record[column] = measures[column][index] if column in measures else row[column]
+        records.append(pd.DataFrame({key: [value] for key, value in record.items()}))
+    return records
+
+
+# Hash, parse and validate one roster file; bulk import runs this in worker processes, so it stays chain-free
+def parse_roster_file(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    stat = os.stat(path)
+    result = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime,
+              'sha256': hashlib.sha256(data).hexdigest(), 'rows': 0, 'valid': None, 'errors': {}}
+    try:
+        roster = read_roster(io.BytesIO(data))
+    except Exception as e:
+        result['errors'] = {'file': str(e)}
+        return result
+    row_errors = validate_trials(roster)
+    invalid = row_errors != ""
+    result['rows'] = len(roster)
+    result['valid'] = roster[~invalid]
+    result['errors'] = {int(row): message for row, message in row_errors[invalid].items()}
+    return result